@@ -1,19 +1,22 @@
 import os
-import cv2
-import openai
+import metrics
 import argparse
-import numpy as np
-from tqdm import tqdm
-import speech_recognition as sr
-from pydub import AudioSegment
 from moviepy import VideoFileClip, concatenate_videoclips
-from collections import namedtuple
-import tempfile
+from frame_bus import FrameBus, SceneAnalyzer, MotionAnalyzer
+from parallel_scenes import find_scenes_parallel
+from resumable_scenes import iter_scenes
+from coarse_scenes import find_scenes_coarse_to_fine
+from stage_cache import StageCache
+from audio_stream import EnergyIndex, scene_wav_bytes
+from render import probe_media, render_scenes, segment_scenes, encode_scenes_parallel
+from weight_sweep import write_feature_table
+from motion_estimators import ESTIMATORS
 import logging
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-Scene = namedtuple("Scene", ["start", "end"])
+# scoring weights behind data/scene_data.csv
+DEFAULT_WEIGHTS = {'audio': 2.0, 'motion': 0.0, 'speech': 0.0}
 
 def calculate_audio_energy(audio_segment):
     """calculate rms energy of audio segment"""
@@ -24,200 +27,235 @@ def calculate_scene_scores(scene, audio_energy, motion_activity, speech_detected
     return (
         weights['audio'] * audio_energy +
         weights['motion'] * motion_activity +
-        weights['speech'] * int(speech_detected)
+        weights['speech'] * int(bool(speech_detected))
     )
 
-def find_scenes_opencv(video_path, diff_threshold=0.5, scene_detection_skip=5, min_scene_duration=5.0, motion_threshold=0.05):
+def find_scenes_opencv(video_path, diff_threshold=0.5, scene_detection_skip=5, min_scene_duration=5.0, motion_threshold=0.05, workers=1, checkpoint_path=None, coarse_to_fine=False, decoder_options=None, motion_estimator="farneback"):
     """
-    enhanced scene detection with robustness filters
+    enhanced scene detection with robustness filters.
+    motion_estimator picks the motion backend (see motion_estimators), and
+    decoder_options (backend, size, threads) select the frame decoder of the serial scan.
+    with workers > 1 the video is scanned in parallel chunks, see parallel_scenes.
+    with a checkpoint_path the scan is periodically checkpointed and resumed, see resumable_scenes.
+    coarse_to_fine runs optical flow only around thumbnail-detected candidates, see coarse_scenes
     """
-    scenes = []
+    if coarse_to_fine:
+        try:
+            return find_scenes_coarse_to_fine(video_path, diff_threshold, scene_detection_skip, min_scene_duration, motion_threshold, motion_estimator=motion_estimator)
+        except Exception as e:
+            logging.error(f"[scene detection error]: {e}")
+            return []
+
+    if checkpoint_path:
+        try:
+            return list(iter_scenes(
+                video_path,
+                checkpoint_path,
+                diff_threshold=diff_threshold,
+                scene_detection_skip=scene_detection_skip,
+                min_scene_duration=min_scene_duration,
+                motion_threshold=motion_threshold,
+                motion_estimator=motion_estimator
+            ))
+        except Exception as e:
+            logging.error(f"[scene detection error]: {e}")
+            return []
+
+    if workers != 1:
+        try:
+            return find_scenes_parallel(video_path, diff_threshold, scene_detection_skip, min_scene_duration, motion_threshold, workers, motion_estimator)
+        except Exception as e:
+            logging.error(f"[scene detection error]: {e}")
+            return []
+
+    analyzer = SceneAnalyzer(diff_threshold, scene_detection_skip, min_scene_duration, motion_threshold, motion_estimator)
     try:
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            logging.error(f"failed to open video: {video_path}")
-            return scenes
-
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        current_scene_start = 0.0
-        ret, prev_frame = cap.read()
-        if not ret:
-            logging.error("could not read the first frame.")
-            cap.release()
-            return scenes
-
-        prev_gray = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
-        
-        prev_hsv = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2HSV)
-        prev_hist = cv2.calcHist([prev_hsv], [0, 1], None, [50, 50], [0, 180, 0, 256])
-        cv2.normalize(prev_hist, prev_hist, 0, 1, cv2.NORM_MINMAX)
-
-        significant_changes = 0
-        max_insignificant_changes = 3
-
-        with tqdm(total=total_frames, desc="Scene Detection", unit="frames") as pbar:
-            while True:
-                for _ in range(scene_detection_skip):
-                    cap.grab()
-
-                ret, frame = cap.read()
-                if not ret:
-                    break
-
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                flow = cv2.calcOpticalFlowFarneback(prev_gray, gray, None, 0.5, 3, 15, 3, 5, 1.2, 0)
-                magnitude, _ = cv2.cartToPolar(flow[..., 0], flow[..., 1])
-                motion_intensity = np.mean(magnitude)
-
-                hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-                hist = cv2.calcHist([hsv], [0, 1], None, [50, 50], [0, 180, 0, 256])
-                cv2.normalize(hist, hist, 0, 1, cv2.NORM_MINMAX)
-
-                distance = cv2.compareHist(prev_hist, hist, cv2.HISTCMP_CORREL)
-                color_change_intensity = 1 - distance
-
-                combined_change = (color_change_intensity * 0.7) + (motion_intensity * 0.3)
-
-                if combined_change > diff_threshold and motion_intensity > motion_threshold:
-                    significant_changes += 1
-                    
-                    if significant_changes > max_insignificant_changes:
-                        current_time = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
-                        
-                        if (current_time - current_scene_start) >= min_scene_duration:
-                            scenes.append(Scene(current_scene_start, current_time))
-                            current_scene_start = current_time
-                            significant_changes = 0
-                else:
-                    significant_changes = max(0, significant_changes - 1)
-
-                prev_gray = gray
-                prev_hist = hist
-
-                pbar.update(scene_detection_skip + 1)
-
-            final_time = total_frames / fps
-            if (final_time - current_scene_start) >= min_scene_duration:
-                scenes.append(Scene(current_scene_start, final_time))
-
-        cap.release()
+        FrameBus(video_path, [analyzer], desc="Scene Detection", **(decoder_options or {})).run()
     except Exception as e:
         logging.error(f"[scene detection error]: {e}")
-    return scenes
+    return analyzer.scenes
 
-def extract_audio_features(video_path, scenes):
-    """extract audio energy and detect speech for each scene using whisper api"""
+def extract_audio_features(video_path, scenes, speech_backend="whisper", transcribe=False, min_speech_ratio=0.0, transcription_options=None, vad_model=None):
+    """
+    extract audio energy and speech presence for each scene.
+    audio is streamed from ffmpeg into a sum-of-squares index, so scene rms costs
+    one subtraction and memory does not grow with the pcm size.
+    speech_backend="vad" runs silero vad over the same pcm stream, so the soundtrack is
+    decoded once, and reports the share of each scene covered by speech; "whisper" transcribes every scene with the whisper api.
+    with the vad backend, transcribe=True also transcribes the scenes that contain speech.
+    transcription_options are passed to transcription.transcribe_scenes.
+    vad_model is an already loaded silero model, loaded here when None.
+    returns (scene, energy, speech_detected, speech_ratio) tuples; with the whisper backend a
+    scene whose transcription still failed after all retries has speech_detected and
+    speech_ratio None, so callers can tell it apart from silence and retry it later
+    """
 
     audio_data = []
-    api_key = os.environ.get("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OpenAI API key not found. Please set the OPENAI_API_KEY environment variable.")
-    client = openai.OpenAI(api_key=api_key)
+    options = dict(transcription_options or {})
+    if speech_backend == "whisper" or transcribe:
+        options.setdefault("api_key", os.environ.get("OPENAI_API_KEY"))
+        if not options["api_key"] and not options.get("base_url"):
+            raise ValueError("OpenAI API key not found. Please set the OPENAI_API_KEY environment variable.")
 
     try:
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
-            video = VideoFileClip(video_path)
-            video.audio.write_audiofile(temp_audio.name, codec="pcm_s16le")
-            video.close()
-
-            audio = AudioSegment.from_file(temp_audio.name)
-            for scene in scenes:
-                segment = audio[int(scene.start * 1000):int(scene.end * 1000)]
-                energy = calculate_audio_energy(segment)
-
-                with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_segment:
-                    segment.export(temp_segment.name, format="wav")
-
-                    try:
-                        with open(temp_segment.name, "rb") as audio_file:
-                            response = client.audio.transcriptions.create(
-                                model="whisper-1",
-                                file=audio_file,
-                                response_format="text",
-                                language="ru"
-                            )
-
-                        if response.strip():
-                                    speech_detected = True
-                                    first_words = ' '.join(response.strip().split()[:5])
-                                    logging.info(f"[scene {scene.start:.1f}-{scene.end:.1f}, first words: {first_words}")
-                        
-                        speech_detected = bool(response.strip())
-                        
-                    except Exception as e:
-                        logging.error(f"[whisper api error for scene {scene.start}-{scene.end}]: {e}")
-                        speech_detected = False
-                    
-                    os.unlink(temp_segment.name)
-
-                audio_data.append((scene, energy, speech_detected))
-
-            os.unlink(temp_audio.name)
+        if speech_backend == "vad":
+            # silero and torch are only needed for this backend; energy and speech come from one decode
+            from vad_processing import stream_speech_segments, speech_ratio
+            energy_index = EnergyIndex(16000, 1)
+            speech_segments = list(stream_speech_segments(video_path, vad_model, energy_index=energy_index))
+            energy_index.finish()
+        else:
+            energy_index = EnergyIndex.from_media(video_path)
 
+        for scene in scenes:
+            energy = energy_index.rms(scene.start, scene.end)
+
+            if speech_backend == "vad":
+                ratio = speech_ratio(speech_segments, scene.start, scene.end)
+                audio_data.append((scene, energy, ratio > min_speech_ratio, ratio))
+            else:
+                audio_data.append((scene, energy, False, 0.0))
+
+        if speech_backend == "whisper" or transcribe:
+            # the openai sdk is only needed when scenes are transcribed
+            from transcription import transcribe_scenes
+            pending = [i for i, features in enumerate(audio_data) if speech_backend == "whisper" or features[2]]
+            with metrics.stage("transcription"):
+                transcripts = transcribe_scenes(
+                    [scenes[i] for i in pending],
+                    lambda scene: scene_wav_bytes(video_path, scene.start, scene.end),
+                    **options
+                )
+
+            for i, response in zip(pending, transcripts):
+                scene, energy, speech_detected, ratio = audio_data[i]
+                if response:
+                    first_words = ' '.join(response.split()[:5])
+                    logging.info(f"[scene {scene.start:.1f}-{scene.end:.1f}, first words: {first_words}")
+
+                if speech_backend == "whisper":
+                    if response is None:
+                        audio_data[i] = (scene, energy, None, None)
+                    else:
+                        speech_detected = bool(response)
+                        audio_data[i] = (scene, energy, speech_detected, float(speech_detected))
+
+            failed = sum(1 for features in audio_data if features[2] is None)
+            if failed:
+                logging.warning(f"[transcription failed for {failed} of {len(audio_data)} scenes, scored as no speech for this run]")
 
     except Exception as e:
         logging.error(f"[audio feature extraction error]: {e}")
     return audio_data
 
-def detect_motion(video_path, scenes, motion_threshold=5000):
-    """detect motion activity in each scene"""
-    motion_data = []
-    try:
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            logging.error("failed to open video for motion detection.")
-            return []
+def build_motion_timeline(video_path, decoder_options=None):
+    """decode the video once into a per-frame motion timeline"""
+    analyzer = MotionAnalyzer()
+    bus = FrameBus(video_path, [analyzer], desc="Motion Detection", **(decoder_options or {}))
+    bus.run()
+    return analyzer.timeline(bus.fps)
 
-        for scene in scenes:
-            cap.set(cv2.CAP_PROP_POS_MSEC, scene.start * 1000)
-            _, prev_frame = cap.read()
-            if prev_frame is None:
-                motion_data.append((scene, 0))
-                continue
-
-            prev_gray = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
-            motion_activity = 0
-
-            while cap.get(cv2.CAP_PROP_POS_MSEC) < scene.end * 1000:
-                ret, curr_frame = cap.read()
-                if not ret:
-                    break
-                curr_gray = cv2.cvtColor(curr_frame, cv2.COLOR_BGR2GRAY)
-                diff = cv2.absdiff(prev_gray, curr_gray)
-                motion_activity += np.sum(diff > 25)
-                prev_gray = curr_gray
-
-            motion_data.append((scene, motion_activity))
-
-        cap.release()
+def detect_motion(video_path, scenes, motion_threshold=5000, timeline=None):
+    """
+    detect motion activity in each scene.
+    pass a prebuilt (or MotionTimeline.load-ed) timeline to re-score new scene
+    lists without decoding the video again
+    """
+    try:
+        if timeline is None:
+            timeline = build_motion_timeline(video_path)
+        return timeline.scene_activity(scenes)
     except Exception as e:
         logging.error(f"[motion detection error]: {e}")
-    return motion_data
+    return []
 
-def create_highlight_summary(input_path_name, output_path_name, summary_percent, weights):
-    """create a highlight summary video"""
+def analyze_video(input_path_name, cache=None, scene_params=None, pixel_threshold=25, decoder_options=None, motion_estimator="farneback"):
+    """
+    run scene and motion analysis in one decode pass, skipping any stage
+    whose result is already in the stage cache
+    """
+    decoder_options = decoder_options or {}
+    scene_params = scene_params or dict(diff_threshold=0.5, scene_detection_skip=5, min_scene_duration=5.0, motion_threshold=0.05)
+    scene_params = {**scene_params, "motion_estimator": motion_estimator}
+    # results depend on the analysis resolution, not on the backend that produced it
+    scene_key = {**scene_params, "analysis_size": decoder_options.get("size")}
+    motion_key = {"pixel_threshold": pixel_threshold, "analysis_size": decoder_options.get("size")}
+
+    scenes_hit, scenes = cache.get(input_path_name, "find_scenes_opencv", scene_key) if cache else (False, None)
+    timeline_hit, timeline = cache.get(input_path_name, "detect_motion", motion_key) if cache else (False, None)
+    if scenes_hit and timeline_hit:
+        return scenes, timeline
+
+    analyzers = []
+    if not scenes_hit:
+        scene_analyzer = SceneAnalyzer(**scene_params)
+        analyzers.append(scene_analyzer)
+    if not timeline_hit:
+        motion_analyzer = MotionAnalyzer(pixel_threshold)
+        analyzers.append(motion_analyzer)
+
+    bus = FrameBus(input_path_name, analyzers, desc="Video Analysis", **decoder_options)
+    bus.run()
+
+    if not scenes_hit:
+        scenes = scene_analyzer.scenes
+        if cache and scenes:
+            cache.put(input_path_name, "find_scenes_opencv", scene_key, scenes)
+    if not timeline_hit:
+        timeline = motion_analyzer.timeline(bus.fps)
+        if cache:
+            cache.put(input_path_name, "detect_motion", motion_key, timeline)
+    return scenes, timeline
+
+def create_highlight_summary(input_path_name, output_path_name, summary_percent, weights, cache=None, speech_backend="whisper", transcribe=False, transcription_options=None, render="smart", features_csv=None, decoder_options=None, motion_estimator="farneback", vad_model=None):
+    """
+    create a highlight summary video.
+    pass a StageCache to reuse scene, motion and audio results across runs
+    that only change weights or summary_percent, and features_csv to save the
+    scene feature table for weight_sweep. vad_model lets a caller that keeps
+    silero loaded, such as batch_runner, reuse it for the vad backend.
+    render="smart" stream-copies keyframe-aligned runs at the source frame rate,
+    render="moviepy" re-encodes everything at 24 fps.
+    stage timings and counts go to the active metrics.MetricsRecorder, if any
+    """
     try:
-        scenes = find_scenes_opencv(input_path_name)
+        with metrics.stage("analyze_video"):
+            scenes, timeline = analyze_video(input_path_name, cache, decoder_options=decoder_options, motion_estimator=motion_estimator)
         if not scenes:
             raise RuntimeError("no scenes detected.")
 
-        audio_features = extract_audio_features(input_path_name, scenes)
+        with metrics.stage("extract_audio_features"):
+            if cache:
+                audio_features = cache.memoize(
+                    input_path_name, "extract_audio_features", {"scenes": scenes, "speech_backend": speech_backend, "energy": "s16le-16000-mono"},
+                    lambda: extract_audio_features(input_path_name, scenes, speech_backend, transcribe, transcription_options=transcription_options, vad_model=vad_model),
+                    # scenes whose transcription failed are not cached, so the next run retries them
+                    should_store=lambda value: len(value) == len(scenes) and all(features[2] is not None for features in value)
+                )
+            else:
+                audio_features = extract_audio_features(input_path_name, scenes, speech_backend, transcribe, transcription_options=transcription_options, vad_model=vad_model)
 
-        motion_features = detect_motion(input_path_name, scenes)
+        with metrics.stage("detect_motion"):
+            motion_features = detect_motion(input_path_name, scenes, timeline=timeline)
 
         combined_data = [
             (scene, audio_energy, motion_activity, speech_detected)
-            for ((scene, audio_energy, speech_detected), (_, motion_activity)) in zip(audio_features, motion_features)
+            for ((scene, audio_energy, speech_detected, _), (_, motion_activity)) in zip(audio_features, motion_features)
         ]
 
+        if features_csv:
+            write_feature_table(features_csv, combined_data, weights)
+
         combined_data.sort(
             key=lambda x: calculate_scene_scores(x[0], x[1], x[2], x[3], weights),
             reverse=True
         )
 
-        video = VideoFileClip(input_path_name)
-        total_duration = video.duration
+        if render == "smart":
+            total_duration = float(probe_media(input_path_name)[0]["duration"])
+        else:
+            video = VideoFileClip(input_path_name)
+            total_duration = video.duration
         target_summary_length = total_duration * summary_percent
 
         selected_scenes = []
@@ -237,40 +275,123 @@ def create_highlight_summary(input_path_name, output_path_name, summary_percent,
 
         selected_scenes.sort(key=lambda scene: scene.start)
 
-        summary_clips = [video.subclipped(scene.start, scene.end) for scene in selected_scenes]
-        summary = concatenate_videoclips(summary_clips)
+        with metrics.stage("render"):
+            if render == "smart":
+                render_scenes(input_path_name, selected_scenes, output_path_name)
+            else:
+                summary_clips = [video.subclipped(scene.start, scene.end) for scene in selected_scenes]
+                summary = concatenate_videoclips(summary_clips)
 
-        summary.write_videofile(output_path_name, codec="libx264", fps=24, audio_codec="aac")
+                summary.write_videofile(output_path_name, codec="libx264", fps=24, audio_codec="aac")
 
     except Exception as e:
         logging.error(f"error in summary creation: {e}")
         return None
 
-def save_scenes(input_path_name, output_directory):
-    """save detected scenes as individual video clips"""
+def save_scenes(input_path_name, output_directory, workers=1, export_mode="segment", checkpoint_path=None, coarse_to_fine=False, decoder_options=None, motion_estimator="farneback", export_workers=None):
+    """
+    save detected scenes as individual video clips.
+    export_mode="segment" stream-copies all scenes in a single ffmpeg pass (cuts snap to keyframes),
+    "parallel" re-encodes scenes frame-accurately in worker processes, and is also the fallback
+    when the segment pass fails. workers is the scene detection process count, export_workers
+    the re-encode process count, all cores when None
+    """
     os.makedirs(output_directory, exist_ok=True)
     
-    scenes = find_scenes_opencv(
-        input_path_name, 
-        diff_threshold=0.2,
-        scene_detection_skip=1,
-        min_scene_duration=0.5,
-        motion_threshold=0.05
-    )
-    
-    video = VideoFileClip(input_path_name)
-    
-    for i, scene in enumerate(scenes):
-        clip = video.subclipped(scene.start, scene.end)
-        output_path = os.path.join(output_directory, f"scene_{i+1}.mp4")
-        clip.write_videofile(output_path, codec='libx264')
-    
-    video.close()
+    with metrics.stage("find_scenes_opencv"):
+        scenes = find_scenes_opencv(
+            input_path_name, 
+            diff_threshold=0.2,
+            scene_detection_skip=1,
+            min_scene_duration=0.5,
+            motion_threshold=0.05,
+            workers=workers,
+            checkpoint_path=checkpoint_path,
+            coarse_to_fine=coarse_to_fine,
+            decoder_options=decoder_options,
+            motion_estimator=motion_estimator
+        )
+
+    with metrics.stage("export"):
+        if export_mode == "segment":
+            try:
+                return segment_scenes(input_path_name, scenes, output_directory)
+            except Exception as e:
+                logging.warning(f"[segment export failed, re-encoding scenes instead]: {e}")
+
+        return encode_scenes_parallel(input_path_name, scenes, output_directory, workers=export_workers)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Video Summarization Script")
     parser.add_argument('input_video', type=str, help="Path to the input video file")
     parser.add_argument('output_directory', type=str, help="Path to the output directoty")
+    parser.add_argument('--workers', type=int, default=1, help="Number of processes for scene detection (0 = all cores)")
+    parser.add_argument('--export-workers', type=int, default=0, help="Number of processes for parallel export (default: 0 = all cores)")
+    parser.add_argument('--checkpoint', type=str, default=None, help="Checkpoint file to resume an interrupted scene detection from")
+    parser.add_argument('--coarse-to-fine', action='store_true', help="Run optical flow only around candidate cuts found by a cheap thumbnail scan")
+    parser.add_argument('--decoder', choices=['opencv', 'ffmpeg', 'pyav'], default='opencv', help="Frame decoder backend (default: opencv)")
+    parser.add_argument('--decode-threads', type=int, default=0, help="Decoder threads, 0 lets the backend choose (default: 0)")
+    parser.add_argument('--analysis-width', type=int, default=None, help="Downscale frames to this width before analysis")
+    parser.add_argument('--motion-estimator', choices=sorted(ESTIMATORS), default='farneback',
+                        help="Motion estimator for scene detection (default: farneback)")
+    parser.add_argument('--export-mode', choices=['segment', 'parallel'], default='segment',
+                        help="Single-pass stream-copy export (segment) or frame-accurate parallel re-encode (default: segment)")
+    parser.add_argument('--summary', action='store_true', help="Write a highlight summary instead of individual scenes")
+    parser.add_argument('--summary-percent', type=float, default=0.1, help="Target summary length as a fraction of the input (default: 0.1)")
+    parser.add_argument('--weights', type=float, nargs=3, metavar=('AUDIO', 'MOTION', 'SPEECH'),
+                        default=[DEFAULT_WEIGHTS['audio'], DEFAULT_WEIGHTS['motion'], DEFAULT_WEIGHTS['speech']],
+                        help="Scene scoring weights")
+    parser.add_argument('--speech-backend', choices=['vad', 'whisper'], default='vad',
+                        help="Local silero vad or per-scene whisper transcription for speech detection (default: vad)")
+    parser.add_argument('--transcribe', action='store_true', help="Also transcribe scenes with speech when using the vad backend")
+    parser.add_argument('--transcribe-concurrency', type=int, default=4, help="Maximum concurrent transcription requests (default: 4)")
+    parser.add_argument('--transcribe-rate', type=float, default=2.0, help="Maximum transcription requests per second (default: 2.0)")
+    parser.add_argument('--transcribe-retries', type=int, default=3, help="Retries per scene on transient api errors (default: 3)")
+    parser.add_argument('--transcription-base-url', type=str, default=None, help="Alternative transcription api endpoint, e.g. a local server")
+    parser.add_argument('--render', choices=['smart', 'moviepy'], default='smart',
+                        help="Stream-copy keyframe-aligned runs (smart) or re-encode everything with moviepy (default: smart)")
+    parser.add_argument('--cache-dir', type=str, default=None, help="Directory for cached stage results")
+    parser.add_argument('--cache-size-mb', type=int, default=2048, help="Stage cache size limit in MB (default: 2048)")
+    parser.add_argument('--metrics-dir', type=str, default=None, help="Where to write metrics.json and metrics.prom (default: the output directory)")
+    parser.add_argument('--no-metrics', action='store_true', help="Do not write the per-stage metrics report")
+    parser.add_argument('--profile-stage', action='append', default=[], metavar='STAGE',
+                        help="Profile a stage with cProfile, repeatable, 'all' profiles every stage")
+    parser.add_argument('--profile-dir', type=str, default=None, help="Where to write .prof files (default: the metrics directory)")
 
     args = parser.parse_args()
-    save_scenes(args.input_video, args.output_directory)
\ No newline at end of file
+    decoder_options = {
+        'backend': args.decoder,
+        'threads': args.decode_threads,
+        'size': (args.analysis_width, None) if args.analysis_width else None
+    }
+    metrics_dir = args.metrics_dir or args.output_directory
+    os.makedirs(metrics_dir, exist_ok=True)
+    recorder = metrics.MetricsRecorder(args.profile_stage, args.profile_dir or metrics_dir)
+    with recorder, recorder.stage("summary" if args.summary else "save_scenes"):
+        if args.summary:
+            os.makedirs(args.output_directory, exist_ok=True)
+            cache = StageCache(args.cache_dir, args.cache_size_mb * 1024 * 1024) if args.cache_dir else None
+            weights = dict(zip(('audio', 'motion', 'speech'), args.weights))
+            create_highlight_summary(
+                args.input_video,
+                os.path.join(args.output_directory, "summary.mp4"),
+                args.summary_percent,
+                weights,
+                cache=cache,
+                speech_backend=args.speech_backend,
+                transcribe=args.transcribe,
+                transcription_options={
+                    'concurrency': args.transcribe_concurrency,
+                    'rate': args.transcribe_rate,
+                    'retries': args.transcribe_retries,
+                    'base_url': args.transcription_base_url
+                },
+                render=args.render,
+                features_csv=os.path.join(args.output_directory, "scene_data.csv"),
+                decoder_options=decoder_options,
+                motion_estimator=args.motion_estimator
+            )
+        else:
+            save_scenes(args.input_video, args.output_directory, workers=args.workers or None, export_mode=args.export_mode, export_workers=args.export_workers or None, checkpoint_path=args.checkpoint, coarse_to_fine=args.coarse_to_fine, decoder_options=decoder_options, motion_estimator=args.motion_estimator)
+    if not args.no_metrics:
+        recorder.write(os.path.join(metrics_dir, "metrics.json"), os.path.join(metrics_dir, "metrics.prom"))
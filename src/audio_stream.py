@@ -0,0 +1,109 @@
+import metrics
+import tempfile
+import subprocess
+import numpy as np
+
+
+def stream_pcm(media_path, sample_rate=16000, channels=1, chunk_seconds=10.0):
+    """decode the audio track through an ffmpeg pipe, yielding int16 arrays of shape (samples, channels)"""
+    command = [
+        "ffmpeg", "-v", "error", "-nostdin",
+        "-i", media_path,
+        "-vn", "-ac", str(channels), "-ar", str(sample_rate),
+        "-f", "s16le", "-"
+    ]
+    frame_bytes = 2 * channels
+    chunk_bytes = int(sample_rate * chunk_seconds) * frame_bytes
+
+    metrics.external_call("ffmpeg")
+    # stderr goes to a file, a second pipe nobody reads until stdout ends can fill up and stall ffmpeg
+    stderr = tempfile.TemporaryFile()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+    try:
+        leftover = b""
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            data = leftover + data
+            usable = len(data) - len(data) % frame_bytes
+            leftover = data[usable:]
+            if usable:
+                yield np.frombuffer(data[:usable], dtype=np.int16).reshape(-1, channels)
+        process.wait()
+        if process.returncode != 0:
+            stderr.seek(0)
+            raise RuntimeError(f"ffmpeg failed to decode audio: {stderr.read().decode(errors='replace').strip()[-2000:]}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        stderr.close()
+
+
+def scene_wav_bytes(media_path, start, end, sample_rate=16000):
+    """cut one mono wav clip out of the media file without touching the rest of the audio"""
+    command = [
+        "ffmpeg", "-v", "error", "-nostdin",
+        "-ss", str(start), "-t", str(max(0.0, end - start)),
+        "-i", media_path,
+        "-vn", "-ac", "1", "-ar", str(sample_rate),
+        "-f", "wav", "-"
+    ]
+    metrics.external_call("ffmpeg")
+    return subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout
+
+
+class EnergyIndex(object):
+    """
+    cumulative sum-of-squares index over fixed-size bins of pcm audio.
+    the rms of any time range is one subtraction of two prefix sums; only one int64
+    per bin is kept, so memory does not depend on the sample rate or channel count
+    """
+
+    def __init__(self, sample_rate=16000, channels=1, bin_seconds=0.01):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.bin_samples = max(1, int(sample_rate * bin_seconds))
+        self._bins = []
+        self._carry = np.zeros((0, channels), dtype=np.int16)
+        self.cumulative = None
+        self.total_samples = 0
+
+    def update(self, block):
+        """add a block of int16 samples with shape (samples, channels)"""
+        block = np.concatenate((self._carry, block)) if len(self._carry) else block
+        full = len(block) - len(block) % self.bin_samples
+        if full:
+            squares = np.square(block[:full].astype(np.int64))
+            self._bins.append(squares.reshape(-1, self.bin_samples * self.channels).sum(axis=1))
+        self._carry = block[full:]
+        self.total_samples += full
+
+    def finish(self):
+        if len(self._carry):
+            self._bins.append(np.array([np.square(self._carry.astype(np.int64)).sum()]))
+            self.total_samples += len(self._carry)
+            self._carry = self._carry[:0]
+        bins = np.concatenate(self._bins) if self._bins else np.zeros(0, dtype=np.int64)
+        self._bins = []
+        self.cumulative = np.concatenate(([0], np.cumsum(bins)))
+        return self
+
+    @classmethod
+    def from_media(cls, media_path, sample_rate=16000, channels=1, bin_seconds=0.01):
+        index = cls(sample_rate, channels, bin_seconds)
+        for block in stream_pcm(media_path, sample_rate, channels):
+            index.update(block)
+        return index.finish()
+
+    def rms(self, start, end):
+        """rms energy between two timestamps in seconds"""
+        bin_count = len(self.cumulative) - 1
+        first = min(max(int(start * self.sample_rate) // self.bin_samples, 0), bin_count)
+        last = min(max(int(end * self.sample_rate) // self.bin_samples, first), bin_count)
+        samples = min(last * self.bin_samples, self.total_samples) - first * self.bin_samples
+        if samples <= 0:
+            return 0
+        return int(np.sqrt((self.cumulative[last] - self.cumulative[first]) / (samples * self.channels)))
@@ -0,0 +1,275 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import tempfile
+import traceback
+from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".mov", ".avi", ".webm", ".ts")
+
+# resident memory one worker needs for a pipeline, its warm model included
+PIPELINE_MEMORY_MB = {
+    "summary": 1500,
+    "scenes": 1000,
+    "censor": 6000,
+    "trim": 800,
+    "breakpoints": 2000
+}
+PIPELINES = tuple(PIPELINE_MEMORY_MB)
+
+# models that stay loaded in a worker process between jobs, filled by _init_worker
+_models = {}
+_options = {}
+
+
+def discover_jobs(source, pipelines):
+    """
+    jobs from a directory of videos or a manifest file. manifest lines are either a video
+    path or a json object {"input": path, "id": optional name, "pipelines": optional list};
+    relative paths are resolved against the manifest's directory
+    """
+    entries = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith(VIDEO_EXTENSIONS):
+                entries.append({"input": os.path.join(source, name)})
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                entry = json.loads(line) if line.startswith("{") else {"input": line}
+                entry["input"] = os.path.join(base, entry["input"])
+                entries.append(entry)
+
+    jobs = []
+    for entry in entries:
+        path = os.path.abspath(entry["input"])
+        stem = os.path.splitext(os.path.basename(path))[0]
+        job_id = entry.get("id") or f"{stem}-{hashlib.sha1(path.encode()).hexdigest()[:8]}"
+        job_pipelines = entry.get("pipelines") or list(pipelines)
+        unknown = set(job_pipelines) - set(PIPELINES)
+        if unknown:
+            raise ValueError(f"unknown pipelines for {path}: {', '.join(sorted(unknown))}")
+        jobs.append({"id": job_id, "input": path, "pipelines": job_pipelines})
+    return jobs
+
+
+def plan_workers(pipelines, memory_budget_mb=None, max_workers=None):
+    """
+    worker count that keeps every worker's warm models inside the memory budget.
+    a worker holds the models of all selected pipelines at once, so their footprints add up
+    """
+    if memory_budget_mb is None:
+        memory_budget_mb = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024) * 0.8
+    per_worker = sum(PIPELINE_MEMORY_MB[p] for p in set(pipelines))
+    workers = int(memory_budget_mb // per_worker) if per_worker else os.cpu_count()
+    return max(1, min(workers, max_workers or os.cpu_count() or 1))
+
+
+def write_status(job_dir, status):
+    """replace status.json atomically so readers never see a partial record"""
+    fd, temp_path = tempfile.mkstemp(dir=job_dir, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(status, f, indent=2)
+    os.replace(temp_path, os.path.join(job_dir, "status.json"))
+
+
+def read_status(job_dir):
+    path = os.path.join(job_dir, "status.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _init_worker(pipelines, options):
+    """load every model the selected pipelines need once per worker process"""
+    _options.update(options)
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s - {os.getpid()} - %(levelname)s - %(message)s")
+    if "censor" in pipelines:
+        import whisper
+        _models["whisper"] = whisper.load_model(options["whisper_model"])
+    if "trim" in pipelines or "summary" in pipelines:
+        # summary jobs use the vad speech backend
+        from silero_vad import load_silero_vad
+        _models["silero"] = load_silero_vad()
+    if "breakpoints" in pipelines:
+        import easyocr
+        _models["easyocr"] = easyocr.Reader(["en"], gpu=options["gpu"])
+
+
+def _run_summary(job, job_dir):
+    from app import create_highlight_summary, DEFAULT_WEIGHTS
+    from stage_cache import StageCache
+    output = os.path.join(job_dir, "summary.mp4")
+    cache = StageCache(_options["cache_dir"]) if _options["cache_dir"] else None
+    create_highlight_summary(
+        job["input"], output, _options["summary_percent"], DEFAULT_WEIGHTS,
+        cache=cache, speech_backend="vad", features_csv=os.path.join(job_dir, "scene_data.csv"), vad_model=_models["silero"]
+    )
+    if not os.path.exists(output):
+        raise RuntimeError("no summary was written, see the worker log")
+    return output
+
+
+def _run_scenes(job, job_dir):
+    from app import save_scenes
+    output = os.path.join(job_dir, "scenes")
+    # the batch pool already spreads jobs over the cores, keep each job's export to one process
+    save_scenes(job["input"], output, export_workers=1)
+    return output
+
+
+def _run_censor(job, job_dir):
+    from profanity_filter import censor_video
+    return censor_video(job["input"], _options["mask_audio"], os.path.join(job_dir, "censored.mp4"), model=_models["whisper"])
+
+
+def _run_trim(job, job_dir):
+    from vad_processing import trim_video_by_speech
+    output = os.path.join(job_dir, "trimmed.mp4")
+    trim_video_by_speech(job["input"], output, model=_models["silero"])
+    return output
+
+
+def _run_breakpoints(job, job_dir):
+    from breakpoint_detection import detect_counter_breakpoints
+    output_dir = os.path.join(job_dir, "breakpoints")
+    breakpoints = detect_counter_breakpoints(job["input"], output_dir=output_dir, reader=_models["easyocr"])
+    with open(os.path.join(job_dir, "breakpoints.json"), "w") as f:
+        json.dump([{"second": second, "time": exact_time} for second, exact_time in breakpoints], f, indent=2)
+    return output_dir
+
+
+RUNNERS = {
+    "summary": _run_summary,
+    "scenes": _run_scenes,
+    "censor": _run_censor,
+    "trim": _run_trim,
+    "breakpoints": _run_breakpoints
+}
+
+
+def run_job(job, job_dir):
+    """
+    run one job's pipelines inside a worker. the working directory is switched to the job
+    directory because some pipelines keep temporary files in the current directory
+    """
+    import metrics
+
+    status = read_status(job_dir) or {}
+    status.update({"id": job["id"], "input": job["input"], "pipelines": job["pipelines"], "state": "running", "pid": os.getpid(), "started": time.time()})
+    status.setdefault("results", {})
+    write_status(job_dir, status)
+
+    cwd = os.getcwd()
+    os.chdir(job_dir)
+    recorder = metrics.MetricsRecorder()
+    try:
+        with recorder:
+            for pipeline in job["pipelines"]:
+                if status["results"].get(pipeline, {}).get("state") == "done":
+                    continue
+                start = time.time()
+                try:
+                    with recorder.stage(pipeline):
+                        output = RUNNERS[pipeline](job, job_dir)
+                    status["results"][pipeline] = {"state": "done", "seconds": time.time() - start, "output": output}
+                except Exception as e:
+                    logging.error(f"[batch job {job['id']} {pipeline} failed]: {e}")
+                    status["results"][pipeline] = {
+                        "state": "failed", "seconds": time.time() - start,
+                        "error": str(e), "traceback": traceback.format_exc()[-4000:]
+                    }
+                write_status(job_dir, status)
+    finally:
+        os.chdir(cwd)
+        recorder.write(os.path.join(job_dir, "metrics.json"))
+
+    failed = any(result["state"] == "failed" for result in status["results"].values())
+    status.update({"state": "failed" if failed else "done", "finished": time.time()})
+    write_status(job_dir, status)
+    return status
+
+
+def run_batch(jobs, output_root, options, memory_budget_mb=None, max_workers=None, force=False):
+    """
+    run jobs in a process pool whose size fits the memory budget. each job gets
+    output_root/<job id>/ with a status.json; jobs already done are skipped unless force
+    """
+    pending = []
+    for job in jobs:
+        job_dir = os.path.join(output_root, job["id"])
+        os.makedirs(job_dir, exist_ok=True)
+        status = read_status(job_dir)
+        if not force and status and status.get("state") == "done" and set(job["pipelines"]) <= set(status.get("results", {})):
+            continue
+        if force or status is None:
+            status = {}
+        status.update({"id": job["id"], "input": job["input"], "pipelines": job["pipelines"], "state": "queued", "queued": time.time()})
+        write_status(job_dir, status)
+        pending.append((job, job_dir))
+
+    pipelines = sorted({p for job, _ in pending for p in job["pipelines"]})
+    workers = plan_workers(pipelines, memory_budget_mb, max_workers)
+    logging.info(f"[batch] {len(pending)} of {len(jobs)} jobs to run with {workers} workers, pipelines: {', '.join(pipelines)}")
+
+    results = {}
+    if not pending:
+        return results
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(pipelines, options)) as executor:
+        futures = {executor.submit(run_job, job, job_dir): (job, job_dir) for job, job_dir in pending}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Batch", unit="jobs"):
+            job, job_dir = futures[future]
+            try:
+                results[job["id"]] = future.result()
+            except Exception as e:
+                # the worker itself died, e.g. killed for running out of memory
+                status = read_status(job_dir) or {}
+                status.update({"state": "failed", "error": str(e), "finished": time.time()})
+                write_status(job_dir, status)
+                results[job["id"]] = status
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run pipelines over a directory or manifest of videos with warm, reused models")
+    parser.add_argument("source", help="Directory of videos or manifest file (paths or json objects, one per line)")
+    parser.add_argument("output_root", help="Directory that receives one output directory per job")
+    parser.add_argument("--pipelines", nargs="+", choices=PIPELINES, default=["summary"], help="Pipelines to run per video (default: summary)")
+    parser.add_argument("--memory-budget-mb", type=int, default=None, help="Memory the workers may use together (default: 80%% of RAM)")
+    parser.add_argument("--workers", type=int, default=None, help="Upper bound on worker processes (default: cpu count)")
+    parser.add_argument("--force", action="store_true", help="Re-run jobs whose status is already done")
+    parser.add_argument("--summary-percent", type=float, default=0.1, help="Summary length as a fraction of the input (default: 0.1)")
+    parser.add_argument("--cache-dir", default=None, help="Stage cache directory shared by summary jobs")
+    parser.add_argument("--mask-audio", default="peekaboo.mp3", help="Mask sound for the censor pipeline (default: peekaboo.mp3)")
+    parser.add_argument("--whisper-model", default="medium", help="Whisper model for the censor pipeline (default: medium)")
+    parser.add_argument("--gpu", action="store_true", help="Run easyocr on the gpu")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    options = {
+        "summary_percent": args.summary_percent,
+        "cache_dir": os.path.abspath(args.cache_dir) if args.cache_dir else None,
+        "mask_audio": os.path.abspath(args.mask_audio),
+        "whisper_model": args.whisper_model,
+        "gpu": args.gpu
+    }
+    output_root = os.path.abspath(args.output_root)
+    jobs = discover_jobs(args.source, args.pipelines)
+    results = run_batch(jobs, output_root, options, args.memory_budget_mb, args.workers, args.force)
+
+    failed = [job_id for job_id, status in results.items() if status.get("state") != "done"]
+    print(f"{len(results) - len(failed)} jobs done, {len(failed)} failed")
+    for job_id in failed:
+        print(f"  failed: {os.path.join(output_root, job_id, 'status.json')}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,312 @@
+import os
+import sys
+import cv2
+import csv
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import statistics
+import subprocess
+import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# ground truth of the default synthetic video, all times in seconds.
+# cuts are 1 s bursts of unrelated frames, the detector confirms a boundary a few samples in;
+# motion segments move a textured block slowly enough not to look like a cut;
+# the counter starts at 0/0/0 and its first reading counts as an event
+DEFAULT_SPEC = {
+    "seed": 7,
+    "duration": 60,
+    "fps": 30,
+    "width": 640,
+    "height": 360,
+    "cuts": [10, 22, 35, 48],
+    "burst_seconds": 1.0,
+    "motion": [[4, 8], [26, 32], [40, 45]],
+    "block_speed": 1,
+    "counter_roi": [100, 65, 60, 20],
+    "counter_events": [3, 15, 30, 52]
+}
+
+STAGES = ("find_scenes_opencv", "detect_motion", "process_optical_flow", "detect_counter_breakpoints")
+
+
+def _texture(rng, width, height, hue, cell=20):
+    """blocky random texture tinted with one hue, so scenes differ in color histogram"""
+    cells = rng.integers(60, 256, size=(height // cell + 1, width // cell + 1), dtype=np.uint8)
+    value = cv2.resize(cells, None, fx=cell, fy=cell, interpolation=cv2.INTER_NEAREST)[:height, :width]
+    hsv = np.dstack([np.full_like(value, hue), np.full_like(value, 200), value])
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+
+
+def _draw_counter(frame, roi, value):
+    x, y, w, h = roi
+    frame[y:y+h, x:x+w] = 0
+    cv2.putText(frame, "/".join(map(str, value)), (x + 3, y + h - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1, cv2.LINE_AA)
+
+
+def generate_video(path, spec=DEFAULT_SPEC):
+    """render the synthetic benchmark video described by spec with cv2.VideoWriter"""
+    rng = np.random.default_rng(spec["seed"])
+    fps, width, height = spec["fps"], spec["width"], spec["height"]
+    burst_frames = int(spec["burst_seconds"] * fps)
+    cut_frames = [int(t * fps) for t in spec["cuts"]]
+    event_frames = [int(t * fps) for t in spec["counter_events"]]
+
+    block = _texture(rng, 120, 120, 0)
+    scene_hues = rng.permutation(np.linspace(0, 179, len(cut_frames) + 1, dtype=np.uint8))
+    background = _texture(rng, width, height, scene_hues[0])
+    scene = 0
+    counter = [0, 0, 0]
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    if not writer.isOpened():
+        raise ValueError(f"could not open video writer: {path}")
+    try:
+        for index in range(int(spec["duration"] * fps)):
+            t = index / fps
+            if scene < len(cut_frames) and index >= cut_frames[scene] + burst_frames:
+                scene += 1
+                background = _texture(rng, width, height, scene_hues[scene])
+
+            if scene < len(cut_frames) and index >= cut_frames[scene]:
+                # every frame of the burst is unrelated to the previous one
+                frame = _texture(rng, width, height, int(rng.integers(0, 180)))
+            else:
+                frame = background.copy()
+
+            for start, end in spec["motion"]:
+                if start <= t < end:
+                    offset = int((t - start) * fps * spec["block_speed"]) % (width - 120)
+                    frame[height - 140:height - 20, offset:offset + 120] = block
+
+            counter_index = sum(1 for frame_index in event_frames if frame_index <= index)
+            while sum(counter) < counter_index:
+                counter[sum(counter) % 3] += 1
+            _draw_counter(frame, spec["counter_roi"], counter)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
+
+
+def match_events(detected, truth, tolerance):
+    """one-to-one match of detected to true event times within tolerance, returns precision/recall"""
+    unmatched = list(truth)
+    true_positives = 0
+    for t in sorted(detected):
+        candidates = [u for u in unmatched if abs(u - t) <= tolerance]
+        if candidates:
+            unmatched.remove(min(candidates, key=lambda u: abs(u - t)))
+            true_positives += 1
+    precision = true_positives / len(detected) if detected else float(not truth)
+    recall = true_positives / len(truth) if truth else 1.0
+    return {"precision": precision, "recall": recall, "detected": len(detected), "expected": len(truth)}
+
+
+def moving_windows(spec):
+    """per-second ground truth: does the window's midpoint fall in a motion segment or cut burst"""
+    intervals = [tuple(m) for m in spec["motion"]] + [(c, c + spec["burst_seconds"]) for c in spec["cuts"]]
+    return [any(start <= s + 0.5 < end for start, end in intervals) for s in range(int(spec["duration"]))]
+
+
+def window_scores(predicted, actual):
+    true_positives = sum(1 for p, a in zip(predicted, actual) if p and a)
+    precision = true_positives / sum(predicted) if any(predicted) else float(not any(actual))
+    recall = true_positives / sum(actual) if any(actual) else 1.0
+    return {"precision": precision, "recall": recall, "detected": sum(predicted), "expected": sum(actual)}
+
+
+def _setup_find_scenes(video_path, work_dir, spec):
+    from app import find_scenes_opencv
+    return lambda: [scene.start for scene in find_scenes_opencv(video_path)[1:]]
+
+
+def _setup_detect_motion(video_path, work_dir, spec):
+    from app import detect_motion
+    from frame_bus import Scene
+    windows = [Scene(float(s), float(s + 1)) for s in range(int(spec["duration"]))]
+    return lambda: [activity for _, activity in detect_motion(video_path, windows)]
+
+
+def _setup_optical_flow(video_path, work_dir, spec):
+    from video_distillation import process_optical_flow
+    output_csv = os.path.join(work_dir, "motion_intensity.csv")
+
+    def run():
+        process_optical_flow(video_path, output_csv, os.path.join(work_dir, "optical_flow_video.mp4"))
+        seconds = [[] for _ in range(int(spec["duration"]))]
+        with open(output_csv, newline="") as f:
+            for row in csv.DictReader(f):
+                second = int(float(row["time"]))
+                if second < len(seconds):
+                    seconds[second].append(float(row["mean_motion_intensity"]))
+        return [float(np.mean(values)) if values else 0.0 for values in seconds]
+    return run
+
+
+def _setup_counter(video_path, work_dir, spec):
+    import easyocr
+    from breakpoint_detection import detect_counter_breakpoints
+    reader = easyocr.Reader(["en"], gpu=False, verbose=False)
+    output_dir = os.path.join(work_dir, "breakpoints")
+    return lambda: [exact_time for _, exact_time in detect_counter_breakpoints(
+        video_path, roi=tuple(spec["counter_roi"]), fps=spec["fps"], output_dir=output_dir, reader=reader
+    )]
+
+
+SETUPS = {
+    "find_scenes_opencv": _setup_find_scenes,
+    "detect_motion": _setup_detect_motion,
+    "process_optical_flow": _setup_optical_flow,
+    "detect_counter_breakpoints": _setup_counter
+}
+
+
+def _run_stage(stage, video_path, work_dir, spec):
+    """
+    run one stage in a fresh worker process. model loading and imports happen before the
+    clock starts; peak rss is the worker's ru_maxrss, so it includes the imports
+    """
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    run = SETUPS[stage](video_path, work_dir, spec)
+    setup_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    output = run()
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, children.ru_maxrss)
+    return {
+        "wall_seconds": wall,
+        "cpu_seconds": cpu + children.ru_utime + children.ru_stime,
+        "setup_rss_mb": setup_rss / 1024,
+        "peak_rss_mb": peak_rss / 1024,
+        "output": output
+    }
+
+
+def score_stage(stage, output, spec, tolerance=1.5, moving_pixel_ratio=0.001, flow_threshold=0.02):
+    """precision/recall of a stage's output against the synthetic ground truth"""
+    if stage == "find_scenes_opencv":
+        return match_events(output, spec["cuts"], tolerance)
+    if stage == "detect_counter_breakpoints":
+        return match_events(output, [0] + list(spec["counter_events"]), tolerance)
+    if stage == "detect_motion":
+        limit = moving_pixel_ratio * spec["width"] * spec["height"] * spec["fps"]
+        return window_scores([activity > limit for activity in output], moving_windows(spec))
+    return window_scores([intensity > flow_threshold for intensity in output], moving_windows(spec))
+
+
+def benchmark(stages=STAGES, spec=DEFAULT_SPEC, repeat=1, work_dir=None, tolerance=1.5):
+    """generate the synthetic video once and benchmark each stage `repeat` times in fresh processes"""
+    with tempfile.TemporaryDirectory(dir=work_dir) as temp_dir:
+        video_path = generate_video(os.path.join(temp_dir, "synthetic.mp4"), spec)
+        frames = int(spec["duration"] * spec["fps"])
+        context = multiprocessing.get_context("spawn")
+        results = {}
+
+        for stage in stages:
+            runs = []
+            try:
+                for _ in range(repeat):
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                        runs.append(executor.submit(_run_stage, stage, video_path, temp_dir, spec).result())
+            except ImportError as e:
+                results[stage] = {"status": "skipped", "reason": str(e)}
+                print(f"[{stage}] skipped: {e}", file=sys.stderr)
+                continue
+            except Exception as e:
+                results[stage] = {"status": "error", "reason": str(e)}
+                print(f"[{stage}] error: {e}", file=sys.stderr)
+                continue
+
+            wall = statistics.median(run["wall_seconds"] for run in runs)
+            results[stage] = {
+                "status": "ok",
+                "frames": frames,
+                "wall_seconds": wall,
+                "fps": frames / wall if wall else 0.0,
+                "cpu_seconds": statistics.median(run["cpu_seconds"] for run in runs),
+                "setup_rss_mb": max(run["setup_rss_mb"] for run in runs),
+                "peak_rss_mb": max(run["peak_rss_mb"] for run in runs),
+                **score_stage(stage, runs[-1]["output"], spec, tolerance)
+            }
+            print(f"[{stage}] {wall:.2f}s, {results[stage]['fps']:.1f} fps, {results[stage]['peak_rss_mb']:.0f} MB, "
+                  f"precision {results[stage]['precision']:.2f}, recall {results[stage]['recall']:.2f}")
+
+    return {"environment": environment(), "spec": spec, "repeat": repeat, "tolerance": tolerance, "stages": results}
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__
+    }
+
+
+def compare(results, baseline, max_slowdown=0.10, max_memory_growth=0.10, max_accuracy_drop=0.05):
+    """return the list of regressions of results against a baseline report"""
+    regressions = []
+    for stage, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous or previous.get("status") != "ok" or current.get("status") != "ok":
+            continue
+        if current["wall_seconds"] > previous["wall_seconds"] * (1 + max_slowdown):
+            regressions.append(f"{stage}: wall time {previous['wall_seconds']:.2f}s -> {current['wall_seconds']:.2f}s")
+        if current["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + max_memory_growth):
+            regressions.append(f"{stage}: peak rss {previous['peak_rss_mb']:.0f} MB -> {current['peak_rss_mb']:.0f} MB")
+        for metric in ("precision", "recall"):
+            if current[metric] < previous[metric] - max_accuracy_drop:
+                regressions.append(f"{stage}: {metric} {previous[metric]:.2f} -> {current[metric]:.2f}")
+    if baseline.get("spec") != results["spec"]:
+        regressions.append("baseline was recorded on a different synthetic video spec")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages on a synthetic video with known cuts, motion and HUD counter")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES), help="Stages to run (default: all)")
+    parser.add_argument("--spec", help="JSON file overriding the synthetic video spec")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per stage, the median wall time is reported (default: 1)")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="Seconds a detected boundary may be off by (default: 1.5)")
+    parser.add_argument("--output", default="benchmark.json", help="Where to write the JSON report (default: benchmark.json)")
+    parser.add_argument("--compare", help="Baseline JSON report; exit with status 1 on regressions")
+    parser.add_argument("--max-slowdown", type=float, default=0.10, help="Allowed relative wall time increase (default: 0.10)")
+    parser.add_argument("--work-dir", help="Directory for the temporary video and stage outputs")
+
+    args = parser.parse_args()
+
+    spec = dict(DEFAULT_SPEC)
+    if args.spec:
+        with open(args.spec) as f:
+            spec.update(json.load(f))
+
+    results = benchmark(args.stages, spec, args.repeat, args.work_dir, args.tolerance)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"benchmark results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, max_slowdown=args.max_slowdown)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("no regressions against baseline")
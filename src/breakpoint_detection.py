@@ -4,24 +4,412 @@ import numpy as np
 import subprocess
 import os
 import re
+import json
+import queue
 import easyocr
+import threading
 from tqdm import tqdm
 from datetime import datetime
 import matplotlib.pyplot as plt
-from collections import Counter
+from collections import Counter, OrderedDict, deque
+from digit_templates import DigitTemplateMatcher
 
-def process_string(binary_image, reader):
+def parse_counter_text(s):
+    """parse "x/y/z" (or with | separators) into an (x, y, z) tuple or None"""
+    s = s.replace(" ", "")
+    if re.fullmatch(r"\d+[\/|]\d+[\/|]\d+", s):
+        return tuple(map(int, re.split(r'[/|]', s)))
+    return None
+
+def parse_counter(results):
+    """parse one readtext result list into an (x, y, z) counter tuple or None"""
     try:
-        results = reader.readtext(binary_image)
         print(results)
-        s = results[0][1]
-        s = s.replace(" ", "")
-        if re.fullmatch(r"\d+[\/|]\d+[\/|]\d+", s):
-            return tuple(map(int, re.split(r'[/|]', s)))
-        return None
+        return parse_counter_text(results[0][1])
     except Exception:
         return None
 
+def readtext_batched(binary_images, reader):
+    """raw readtext results of equally sized crops from one batched inference"""
+    try:
+        return reader.readtext_batched(binary_images)
+    except Exception:
+        results = []
+        for binary in binary_images:
+            try:
+                results.append(reader.readtext(binary))
+            except Exception:
+                results.append([])
+        return results
+
+def parse_name(results):
+    """join the text boxes of a name strip into one string, None when nothing legible was read"""
+    text = " ".join(" ".join(r[1] for r in results).split())
+    return text if len(text) >= 2 else None
+
+class EasyOCRRecognizer(object):
+    """every crop goes through easyocr, parse turns readtext results into a value"""
+
+    def __init__(self, reader, parse=parse_counter):
+        self.reader = reader
+        self.parse = parse
+        self.ocr_reads = 0
+
+    def read_batch(self, binaries):
+        self.ocr_reads += len(binaries)
+        return [self.parse(results) for results in readtext_batched(binaries, self.reader)]
+
+class TemplateRecognizer(object):
+    """
+    self-calibrating digit matcher for the fixed-font counter. the first calibration_reads
+    easyocr reads with confidence >= min_confidence become glyph templates; after that
+    crops are read by template correlation and only go to easyocr when the match is weak.
+    weak matches keep teaching the templates, so new digits are picked up as they appear.
+    a template read of a counter value easyocr has not confirmed yet is read by easyocr
+    too, so a digit without a template is never passed off as its closest known neighbour
+    """
+
+    def __init__(self, reader, calibration_reads=20, min_confidence=0.9, match_threshold=0.85):
+        self.reader = reader
+        self.calibration_reads = calibration_reads
+        self.min_confidence = min_confidence
+        self.matcher = DigitTemplateMatcher(match_threshold)
+        self.ocr_reads = 0
+        self.template_reads = 0
+        self.confirmed_values = set()
+
+    @property
+    def calibrated(self):
+        return self.matcher.learned_reads >= self.calibration_reads
+
+    def read_batch(self, binaries):
+        values = [None] * len(binaries)
+        fallback = []
+        for i, binary in enumerate(binaries):
+            if self.calibrated:
+                text, _ = self.matcher.match(binary)
+                value = parse_counter_text(text) if text else None
+                if value is not None and value in self.confirmed_values:
+                    values[i] = value
+                    self.template_reads += 1
+                    continue
+            fallback.append(i)
+
+        if fallback:
+            self.ocr_reads += len(fallback)
+            for i, results in zip(fallback, readtext_batched([binaries[i] for i in fallback], self.reader)):
+                values[i] = parse_counter(results)
+                if values[i] is not None:
+                    self.confirmed_values.add(values[i])
+                if values[i] is not None and len(results) == 1 and results[0][2] >= self.min_confidence:
+                    self.matcher.learn(binaries[i], results[0][1])
+        return values
+
+RECOGNIZERS = ("template", "easyocr")
+
+def preprocess_roi(cropped):
+    """upscale and binarize a counter crop for ocr"""
+    gray = cv2.cvtColor(cropped, cv2.COLOR_BGR2GRAY)
+    gray = cv2.resize(gray, None, fx=7, fy=7, interpolation=cv2.INTER_CUBIC)
+    blurred = cv2.GaussianBlur(gray, (7, 7), 0)
+
+    _, binary = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return binary
+
+def sample_regions(cap, regions, frames_per_chunk, total_seconds):
+    """
+    yield (second, frame_count, {region name: crop}) for every frame at least one region
+    samples; each region samples every region.sample_rate-th frame of a second.
+    skipped frames are only grabbed, never converted, and sampled frames are cropped and
+    copied right away, so memory holds one frame regardless of fps and resolution
+    """
+    frame_count = 0
+    for second in range(total_seconds):
+        grabbed = 0
+        for offset in range(frames_per_chunk):
+            if not cap.grab():
+                break
+            grabbed += 1
+            frame_count += 1
+            due = [region for region in regions if offset % region.sample_rate == 0]
+            if due:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                yield second, frame_count, {region.name: region.crop(frame) for region in due}
+        if not grabbed:
+            return
+
+def roi_hash(binary, size):
+    """
+    hash of a binarized crop after shrinking it back to roi size, so single-pixel
+    jitter from the 7x upscale and blur does not change the key
+    """
+    small = cv2.resize(binary, size, interpolation=cv2.INTER_AREA)
+    return np.packbits(small > 127).tobytes()
+
+class OCRMemo(object):
+    """
+    skip ocr for crops already seen: an unchanged crop reuses the last reading and
+    other repeats come from a bounded lru of hash -> parsed counter tuple
+    """
+
+    def __init__(self, recognizer, size, maxsize=256):
+        self.recognizer = recognizer
+        self.size = size
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+        self.last_key = None
+        self.last_value = None
+        self.lookups = 0
+        self.ocr_calls = 0
+
+    def read_batch(self, binaries):
+        """read a batch of crops in order, sending each distinct unseen crop to ocr once"""
+        if self.maxsize <= 0:
+            self.lookups += len(binaries)
+            self.ocr_calls += len(binaries)
+            return self.recognizer.read_batch(binaries)
+
+        keys = [roi_hash(binary, self.size) for binary in binaries]
+        if self.last_key is not None:
+            self.cache.setdefault(self.last_key, self.last_value)
+        missing = {}
+        for key, binary in zip(keys, binaries):
+            if key not in self.cache and key not in missing:
+                missing[key] = binary
+        if missing:
+            self.ocr_calls += len(missing)
+            for key, value in zip(missing, self.recognizer.read_batch(list(missing.values()))):
+                self.cache[key] = value
+
+        values = []
+        for key in keys:
+            self.lookups += 1
+            if key != self.last_key:
+                self.cache.move_to_end(key)
+                self.last_key, self.last_value = key, self.cache[key]
+            values.append(self.last_value)
+        while len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+        return values
+
+_END = object()
+
+def iter_batches(samples, preprocess, batch_size=16, queue_size=64):
+    """
+    run decoding and preprocess(crops) of samples in a background thread and yield lists of
+    up to batch_size (second, frame_count, preprocessed) items in sample order. a batch is
+    whatever is queued when the consumer asks, so it grows while ocr is the bottleneck
+    """
+    items = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for second, frame_count, crops in samples:
+                if stop.is_set():
+                    return
+                items.put((second, frame_count, preprocess(crops)))
+        except Exception as e:
+            items.put(e)
+        finally:
+            items.put(_END)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        finished = False
+        while not finished:
+            batch = []
+            item = items.get()
+            while True:
+                if item is _END:
+                    finished = True
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    break
+                try:
+                    item = items.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                yield batch
+    finally:
+        stop.set()
+        # keep draining so a producer blocked on a full queue can notice stop
+        while producer.is_alive():
+            try:
+                items.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+class HudRegion(object):
+    """
+    one named overlay to read: where it is, how its crop is binarized and parsed, how
+    often it is sampled and how many samples must agree before a new value counts.
+    is_event(previous, value) decides whether an agreed value is an event; values that
+    are not events are ignored, so a misread lower counter does not replace the real one
+    """
+
+    def __init__(
+        self,
+        name,
+        roi,
+        parse,
+        is_event,
+        preprocess=preprocess_roi,
+        samples_per_second=6,
+        window_size=6,
+        consensus_threshold=0.75,
+        recognizer="easyocr",
+        ocr_cache_size=256
+    ):
+        self.name = name
+        self.roi = roi
+        self.parse = parse
+        self.is_event = is_event
+        self.preprocess = preprocess
+        self.samples_per_second = samples_per_second
+        self.window_size = window_size
+        self.consensus_threshold = consensus_threshold
+        self.recognizer = recognizer
+        self.ocr_cache_size = ocr_cache_size
+        self.sample_rate = 1
+
+    def crop(self, frame):
+        x, y, w, h = self.roi
+        return frame[y:y+h, x:x+w].copy()
+
+class ConsensusWindow(object):
+    """majority vote over the last window_size readings of one region"""
+
+    def __init__(self, window_size, consensus_threshold, is_event):
+        self.window_size = window_size
+        self.consensus_threshold = consensus_threshold
+        self.is_event = is_event
+        self.buffer = deque(maxlen=window_size)
+        self.value = None
+
+    def update(self, reading):
+        """add a reading, return (previous, new) when the agreed value is a new event"""
+        self.buffer.append(reading)
+        if len(self.buffer) < self.window_size:
+            return None
+
+        valid = [r for r in self.buffer if r is not None]
+        if not valid:
+            return None
+        consensus, count = Counter(valid).most_common(1)[0]
+        if count / len(self.buffer) < self.consensus_threshold or consensus == self.value:
+            return None
+        if not self.is_event(self.value, consensus):
+            return None
+
+        previous, self.value = self.value, consensus
+        return previous, consensus
+
+def name_changed(prev_value, current_value):
+    return current_value != prev_value
+
+def counter_region(roi=(100, 65, 60, 20), window_size=6, consensus_threshold=0.75, recognizer="template", ocr_cache_size=256):
+    """the k/d/a counter, an event whenever any of its numbers goes up"""
+    return HudRegion(
+        "counter", roi, parse_counter, is_counter_increased,
+        samples_per_second=window_size, window_size=window_size, consensus_threshold=consensus_threshold,
+        recognizer=recognizer, ocr_cache_size=ocr_cache_size
+    )
+
+def hero_name_region(roi=(80, 80, 400, 40), samples_per_second=2, window_size=4, consensus_threshold=0.75, ocr_cache_size=256):
+    """the hero/player name strip, an event whenever the agreed name changes"""
+    return HudRegion(
+        "hero_name", roi, parse_name, name_changed,
+        samples_per_second=samples_per_second, window_size=window_size, consensus_threshold=consensus_threshold,
+        recognizer="easyocr", ocr_cache_size=ocr_cache_size
+    )
+
+HUD_REGIONS = {"counter": counter_region, "hero_name": hero_name_region}
+
+def track_hud(video_path, regions, reader, fps=0, batch_size=16, queue_size=64):
+    """
+    read every region from one shared pass over the video and return the combined,
+    time-ordered event timeline as dicts with region, second, time, previous and value.
+    fps is the number of frames treated as one second, 0 uses the video's frame rate.
+    frames are decoded and preprocessed in a background thread feeding a queue of at
+    most queue_size samples, and each region's ocr reads up to batch_size of them per
+    inference behind its own hash-gated memo
+    """
+    if reader is None:
+        raise ValueError("ocr reader instance is required")
+    if len({region.name for region in regions}) != len(regions):
+        raise ValueError("hud region names must be unique")
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"could not open video: {video_path}")
+
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if fps == 0:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+    frames_per_chunk = int(round(fps))
+    total_seconds = int(total_frames // fps)
+
+    memos = {}
+    windows = {}
+    for region in regions:
+        if region.recognizer not in RECOGNIZERS:
+            raise ValueError(f"unknown recognizer: {region.recognizer}")
+        region.sample_rate = max(1, int(fps / region.samples_per_second))
+        if region.recognizer == "template":
+            recognizer = TemplateRecognizer(reader)
+        else:
+            recognizer = EasyOCRRecognizer(reader, region.parse)
+        memos[region.name] = OCRMemo(recognizer, (region.roi[2], region.roi[3]), region.ocr_cache_size)
+        windows[region.name] = ConsensusWindow(region.window_size, region.consensus_threshold, region.is_event)
+
+    preprocessors = {region.name: region.preprocess for region in regions}
+    events = []
+
+    samples = sample_regions(cap, regions, frames_per_chunk, total_seconds)
+    batches = iter_batches(
+        samples,
+        lambda crops: {name: preprocessors[name](crop) for name, crop in crops.items()},
+        batch_size,
+        queue_size
+    )
+    try:
+        with tqdm(total=total_seconds, desc="analyzing video", unit="s") as pbar:
+            for batch in batches:
+                readings = [{} for _ in batch]
+                for region in regions:
+                    due = [i for i, (_, _, binaries) in enumerate(batch) if region.name in binaries]
+                    if due:
+                        values = memos[region.name].read_batch([batch[i][2][region.name] for i in due])
+                        for i, value in zip(due, values):
+                            readings[i][region.name] = value
+
+                for (second, frame_count, _), sample_readings in zip(batch, readings):
+                    for region in regions:
+                        if region.name not in sample_readings:
+                            continue
+                        change = windows[region.name].update(sample_readings[region.name])
+                        if change is not None:
+                            previous, value = change
+                            print(f"{region.name} changed at second {second} from {previous} to {value}")
+                            events.append({"region": region.name, "second": second, "time": frame_count / fps, "previous": previous, "value": value})
+                pbar.update(batch[-1][0] + 1 - pbar.n)
+    finally:
+        batches.close()
+        cap.release()
+
+    for region in regions:
+        memo = memos[region.name]
+        print(f"{region.name}: recognized {memo.ocr_calls} of {memo.lookups} samples, {memo.recognizer.ocr_reads} of them with easyocr")
+    return events
+
 def detect_counter_breakpoints(
     video_path, 
     roi=(100, 65, 60, 20), 
@@ -30,127 +418,89 @@ def detect_counter_breakpoints(
     window_size=6, 
     consensus_threshold=0.75,
     output_dir="breakpoints",
-    reader=None
+    reader=None,
+    ocr_cache_size=256,
+    batch_size=16,
+    queue_size=64,
+    recognizer="template",
+    extra_regions=(),
+    events_path=None
 ):
     """
-    detect counter breakpoints in a video using ocr
+    detect counter breakpoints in a video using ocr.
+    ocr runs only on crops whose hash was not seen among the last ocr_cache_size
+    distinct crops, 0 runs it on every sample.
+    recognizer="template" reads digits by template matching once it has calibrated on
+    confident easyocr reads, "easyocr" sends every crop to easyocr.
+    extra_regions (HudRegion) are read in the same pass; with events_path the combined
+    timeline of all regions is written there as json
     """
-    if reader is None:
-        raise ValueError("ocr reader instance is required")
-    
     os.makedirs(output_dir, exist_ok=True)
-    
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise ValueError(f"could not open video: {video_path}")
-    
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    video_fps = cap.get(cv2.CAP_PROP_FPS)
-    if fps == 0:
-        fps = video_fps
-    
-    x, y, w, h = roi
-    
-    frames_per_chunk = fps
-    sample_rate = int(fps / window_size)
-    
-    window_buffer = []
-    breakpoints = []
-    second_count = 0
-    frame_count = 0
-    current_counter_value = None
-    
-    total_seconds = total_frames // fps
-    
+
+    regions = [counter_region(roi, window_size, consensus_threshold, recognizer, ocr_cache_size)] + list(extra_regions)
     print("detecting breakpoints...")
-    for second_count in tqdm(range(total_seconds), desc="analyzing video"):
-        chunk_frames = []
-        for _ in range(frames_per_chunk):
-            ret, frame = cap.read()
-            if not ret:
-                break
-            chunk_frames.append(frame)
-            frame_count += 1
-        
-        if not chunk_frames:
-            break
-        
-        sampled_frames = chunk_frames[::sample_rate]
-        
-        for frame in sampled_frames:
-            cropped = frame[y:y+h, x:x+w]
-            gray = cv2.cvtColor(cropped, cv2.COLOR_BGR2GRAY)
-            gray = cv2.resize(gray, None, fx=7, fy=7, interpolation=cv2.INTER_CUBIC)
-            blurred = cv2.GaussianBlur(gray, (7, 7), 0)
-            
-            _, binary = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            counts = process_string(binary, reader)
-            window_buffer.append(counts)
-            if len(window_buffer) > window_size:
-                window_buffer.pop(0)
-            
-            if len(window_buffer) == window_size:
-                valid_counts = [s for s in window_buffer if s is not None]
-                
-                if len(valid_counts) > 0:
-                    most_common = Counter(valid_counts).most_common(1)[0]
-                    consensus_tuple, count = most_common
-                    
-                    if count / len(window_buffer) >= consensus_threshold:
-                        if consensus_tuple != current_counter_value:
-                            if is_counter_increased(current_counter_value, consensus_tuple):
-                                print(f"breakpoint detected at second {second_count} - counter changed from {current_counter_value} to {consensus_tuple}")
-                                
-                                breakpoints.append((second_count, frame_count / fps))
-                                
-                                current_counter_value = consensus_tuple
-    
-    cap.release()
-    
-    print("extracting clips around breakpoints...")
-    clips = []
-    
-    for i, (second, exact_time) in enumerate(breakpoints):
-        start_time = max(0, exact_time - template_duration)
-        end_time = max(0, exact_time + template_duration)
-        
-        output_file = os.path.join(output_dir, f"breakpoint_{i}_{second}s.mp4")
-        clips.append(output_file)
-        
-        cmd = [
-            "ffmpeg", "-y",
-            "-ss", str(start_time),
-            "-to", str(end_time),
-            "-c:v", "libx264",
-            "-c:a", "aac",
-            output_file
-        ]
-        
-        print(f"extracting clip {i+1}/{len(breakpoints)}...")
-        subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    
-    if clips:
-        print("merging clips...")
-        list_file = os.path.join(output_dir, "clips_list.txt")
-        with open(list_file, "w") as f:
-            for clip in clips:
-                f.write(f"file '{clip}'\n")
-        
+    events = track_hud(video_path, regions, reader, fps, batch_size, queue_size)
+    breakpoints = [(event["second"], event["time"]) for event in events if event["region"] == "counter"]
+
+    if events_path:
+        with open(events_path, "w", encoding="utf-8") as f:
+            json.dump(events, f, indent=2, ensure_ascii=False)
+        print(f"hud event timeline saved to: {events_path}")
+
+    if breakpoints:
+        print("extracting clips around breakpoints...")
+        cap = cv2.VideoCapture(video_path)
+        video_fps = cap.get(cv2.CAP_PROP_FPS)
+        total_duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / video_fps if video_fps else None
+        cap.release()
+
+        intervals = merge_windows([exact_time for _, exact_time in breakpoints], template_duration, total_duration)
         merged_output = os.path.join(output_dir, "breakpoints_merged.mp4")
-        cmd = [
-            "ffmpeg", "-y",
-            "-f", "concat",
-            "-safe", "0",
-            "-i", list_file,
-            "-c", "copy",
-            merged_output
-        ]
-        
-        subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        print(f"merged clip saved to: {merged_output}")
+        extract_intervals(video_path, intervals, merged_output)
+        print(f"merged {len(breakpoints)} breakpoints into {len(intervals)} clips, saved to: {merged_output}")
     
     return breakpoints
 
+def merge_windows(times, template_duration, total_duration=None):
+    """merge the +-template_duration windows around each time into sorted, non-overlapping intervals"""
+    intervals = []
+    for t in sorted(times):
+        start = max(0, t - template_duration)
+        end = t + template_duration
+        if total_duration:
+            end = min(end, total_duration)
+        if intervals and start <= intervals[-1][1]:
+            intervals[-1][1] = max(intervals[-1][1], end)
+        else:
+            intervals.append([start, end])
+    return [tuple(interval) for interval in intervals]
+
+def extract_intervals(video_path, intervals, output_path, copy=True):
+    """
+    cut all intervals out of the source and join them with one ffmpeg run: the concat
+    demuxer reads the source once per interval using inpoint/outpoint, with the script
+    passed on stdin. copy=True stream-copies, so each interval starts at the keyframe
+    before its inpoint; copy=False re-encodes for frame-accurate cuts
+    """
+    source = os.path.abspath(video_path).replace("'", "'\\''")
+    script = "ffconcat version 1.0\n" + "".join(
+        f"file '{source}'\ninpoint {start:.3f}\noutpoint {end:.3f}\n" for start, end in intervals
+    )
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "concat", "-safe", "0",
+        "-protocol_whitelist", "file,pipe",
+        "-i", "pipe:0",
+        "-map", "0:v:0", "-map", "0:a:0?"
+    ]
+    cmd += ["-c", "copy"] if copy else ["-c:v", "libx264", "-c:a", "aac"]
+    cmd += ["-avoid_negative_ts", "make_zero", output_path]
+
+    result = subprocess.run(cmd, input=script.encode(), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()[-2000:]}")
+    return output_path
+
 def is_counter_increased(prev_value, current_value):
     """
     compare two counter values to see if any number has increased
@@ -163,12 +513,20 @@ def is_counter_increased(prev_value, current_value):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Detect counter changes in video using OCR")
     parser.add_argument("--input", required=True, type=str, help="Input video file path")
+    parser.add_argument("--recognizer", choices=RECOGNIZERS, default="template",
+                        help="Calibrated digit templates with easyocr fallback, or easyocr for every crop (default: template)")
+    parser.add_argument("--track", nargs="+", choices=[name for name in HUD_REGIONS if name != "counter"], default=[],
+                        help="Other hud regions to read in the same pass as the counter")
+    parser.add_argument("--events-json", default=None, help="Write the combined hud event timeline to this json file")
     args = parser.parse_args()
     
     reader = easyocr.Reader(['en'])
     print(f"processing: {args.input}")
     try:
-        breakpoints = detect_counter_breakpoints(args.input, reader=reader)
+        breakpoints = detect_counter_breakpoints(
+            args.input, reader=reader, recognizer=args.recognizer,
+            extra_regions=[HUD_REGIONS[name]() for name in args.track], events_path=args.events_json
+        )
         print(f"successfully created trimmed video.")
     except Exception as e:
         print(f"error processing video: {e}")
@@ -0,0 +1,119 @@
+import cv2
+import logging
+import numpy as np
+from tqdm import tqdm
+from frame_bus import FrameBus, FrameAnalyzer, FramePacket, SceneSegmenter, ChangeClassifier, compute_histogram
+
+
+class CandidateAnalyzer(FrameAnalyzer):
+    """coarse pass: thumbnail histogram change and mean gray difference between coarse samples"""
+
+    def __init__(self, stride, thumb_width=160):
+        super().__init__()
+        self.stride = stride
+        self.thumb_width = thumb_width
+        self.indices = []
+        self.prev_gray = None
+        self.prev_hist = None
+
+    def process(self, packet):
+        height, width = packet.frame.shape[:2]
+        thumb_size = (self.thumb_width, max(1, round(height * self.thumb_width / width)))
+        thumb = cv2.resize(packet.frame, thumb_size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+        hist = compute_histogram(cv2.cvtColor(thumb, cv2.COLOR_BGR2HSV))
+
+        if self.prev_gray is not None:
+            color_change = 1 - cv2.compareHist(self.prev_hist, hist, cv2.HISTCMP_CORREL)
+            gray_change = float(np.mean(cv2.absdiff(self.prev_gray, gray)))
+            self.indices.append(packet.index)
+            self.timestamps.append(packet.timestamp)
+            self.values.append((color_change, gray_change))
+
+        self.prev_gray = gray
+        self.prev_hist = hist
+
+
+def candidate_windows(indices, values, coarse_stride, fine_stride, color_threshold, gray_threshold, pad_frames):
+    """merge stride-aligned frame ranges around coarse samples that look like a change"""
+    windows = []
+    for index, (color_change, gray_change) in zip(indices, values):
+        if color_change < color_threshold and gray_change < gray_threshold:
+            continue
+        start = max(0, index - coarse_stride - pad_frames) // fine_stride * fine_stride
+        end = -(-(index + pad_frames) // fine_stride) * fine_stride
+        if windows and start <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], end)
+        else:
+            windows.append([start, end])
+    return windows
+
+
+def find_scenes_coarse_to_fine(
+    video_path,
+    diff_threshold=0.5,
+    scene_detection_skip=5,
+    min_scene_duration=5.0,
+    motion_threshold=0.05,
+    coarse_stride=None,
+    candidate_color_threshold=0.15,
+    candidate_gray_threshold=4.0,
+    pad_samples=8,
+    motion_estimator="farneback"
+):
+    """
+    two-stage scene detection.
+    a coarse pass compares small thumbnails every `coarse_stride` frames and keeps frame
+    windows whose histogram or gray difference suggests a change; the fine pass decodes
+    only those windows and runs the farneback + histogram test of find_scenes_opencv at its
+    usual stride. samples outside all windows count as insignificant for the debounce
+    """
+    fine_stride = scene_detection_skip + 1
+    coarse_stride = coarse_stride or fine_stride * 4
+
+    candidates = CandidateAnalyzer(coarse_stride)
+    bus = FrameBus(video_path, [candidates], desc="Coarse Scan")
+    bus.run()
+
+    pad_frames = pad_samples * fine_stride
+    windows = candidate_windows(
+        candidates.indices, candidates.values, coarse_stride, fine_stride,
+        candidate_color_threshold, candidate_gray_threshold, pad_frames
+    )
+    window_frames = sum(end - start for start, end in windows)
+    logging.info(f"[coarse-to-fine] {len(windows)} candidate windows, {window_frames} of {bus.total_frames} frames refined")
+
+    segmenter = SceneSegmenter(min_scene_duration)
+    classifier = ChangeClassifier(diff_threshold, motion_threshold, motion_estimator)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"could not open video: {video_path}")
+
+    last_sample = 0
+    try:
+        for start, end in tqdm(windows, desc="Scene Refinement", unit="windows"):
+            first = max(start, last_sample + fine_stride, fine_stride)
+            if first > end:
+                continue
+            segmenter.skip((first - last_sample) // fine_stride - 1)
+
+            index = first - fine_stride
+            cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            classifier.reset()
+            while index <= end and cap.grab():
+                if index % fine_stride == 0:
+                    ret, frame = cap.retrieve()
+                    if not ret:
+                        break
+                    packet = FramePacket(index, cap.get(cv2.CAP_PROP_POS_MSEC) / 1000, frame)
+                    result = classifier.classify(packet)
+                    if result is not None:
+                        segmenter.update(*result)
+                        last_sample = index
+                index += 1
+    finally:
+        cap.release()
+
+    if bus.fps:
+        segmenter.finish(bus.total_frames / bus.fps)
+    return segmenter.scenes
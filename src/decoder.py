@@ -0,0 +1,208 @@
+import cv2
+import metrics
+import subprocess
+import numpy as np
+from fractions import Fraction
+from render import probe_media, probe_keyframes
+
+PIX_FMTS = ("bgr", "gray", "hsv")
+
+
+def _output_size(width, height, size):
+    """resolve a (width, height) request where either side may be None to keep the aspect ratio"""
+    if size is None:
+        return width, height
+    out_width, out_height = size
+    if out_width is None and out_height is None:
+        return width, height
+    if out_width is None:
+        out_width = round(width * out_height / height / 2) * 2
+    if out_height is None:
+        out_height = round(height * out_width / width / 2) * 2
+    return int(out_width), int(out_height)
+
+
+class OpenCVDecoder(object):
+    """cv2.VideoCapture backend; scaling and color conversion happen after decode"""
+
+    def __init__(self, video_path, size=None, pix_fmt="bgr", threads=0, keyframes_only=False, stride=1):
+        if keyframes_only:
+            raise ValueError("the opencv backend cannot decode keyframes only, use ffmpeg or pyav")
+        self.video_path = video_path
+        self.pix_fmt = pix_fmt
+        self.stride = stride
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise ValueError(f"could not open video: {video_path}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.source_size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self.width, self.height = _output_size(*self.source_size, size)
+
+    def __iter__(self):
+        index = 0
+        try:
+            while self.cap.grab():
+                if index % self.stride == 0:
+                    ret, frame = self.cap.retrieve()
+                    if not ret:
+                        break
+                    if (self.width, self.height) != self.source_size:
+                        frame = cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_AREA)
+                    if self.pix_fmt == "gray":
+                        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                    elif self.pix_fmt == "hsv":
+                        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+                    metrics.count("frames_decoded")
+                    yield index, self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000, frame
+                index += 1
+        finally:
+            self.cap.release()
+
+
+class FFmpegDecoder(object):
+    """
+    ffmpeg pipe backend: multi-threaded decode, scaling and gray conversion inside ffmpeg,
+    skipped frames dropped before the pipe and optional keyframe-only decoding
+    """
+
+    def __init__(self, video_path, size=None, pix_fmt="bgr", threads=0, keyframes_only=False, stride=1):
+        self.video_path = video_path
+        self.pix_fmt = pix_fmt
+        self.threads = threads
+        self.keyframes_only = keyframes_only
+        self.stride = stride
+
+        format_info, video_stream, _ = probe_media(video_path)
+        self.fps = float(Fraction(video_stream["r_frame_rate"]))
+        self.frame_count = int(float(format_info.get("duration", 0)) * self.fps)
+        self.source_size = (int(video_stream["width"]), int(video_stream["height"]))
+        self.width, self.height = _output_size(*self.source_size, size)
+
+    def __iter__(self):
+        command = ["ffmpeg", "-v", "error", "-nostdin", "-threads", str(self.threads)]
+        if self.keyframes_only:
+            command += ["-skip_frame", "nokey"]
+        command += ["-i", self.video_path, "-an"]
+
+        filters = []
+        if self.stride > 1:
+            filters.append(f"select=not(mod(n\\,{self.stride}))")
+        if (self.width, self.height) != self.source_size:
+            filters.append(f"scale={self.width}:{self.height}:flags=area")
+        if filters:
+            command += ["-vf", ",".join(filters)]
+
+        channels = 1 if self.pix_fmt == "gray" else 3
+        command += [
+            "-fps_mode", "passthrough",
+            "-f", "rawvideo", "-pix_fmt", "gray" if self.pix_fmt == "gray" else "bgr24", "-"
+        ]
+
+        # raw frames carry no timestamps, keyframe times come from the packet index instead
+        keyframe_times = probe_keyframes(self.video_path) if self.keyframes_only else None
+        frame_bytes = self.width * self.height * channels
+
+        metrics.external_call("ffmpeg")
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=frame_bytes)
+        try:
+            position = 0
+            while True:
+                data = process.stdout.read(frame_bytes)
+                while data and len(data) < frame_bytes:
+                    more = process.stdout.read(frame_bytes - len(data))
+                    if not more:
+                        break
+                    data += more
+                if len(data) < frame_bytes:
+                    break
+
+                shape = (self.height, self.width) if channels == 1 else (self.height, self.width, 3)
+                frame = np.frombuffer(data, dtype=np.uint8).reshape(shape)
+                if self.pix_fmt == "hsv":
+                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+
+                if keyframe_times is not None:
+                    timestamp = keyframe_times[position] if position < len(keyframe_times) else position / self.fps
+                    index = round(timestamp * self.fps)
+                else:
+                    index = position * self.stride
+                    timestamp = index / self.fps
+                metrics.count("frames_decoded")
+                yield index, timestamp, frame
+                position += 1
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+
+
+class PyAVDecoder(object):
+    """pyav backend with threaded decode, keyframe skipping and per-frame presentation timestamps"""
+
+    def __init__(self, video_path, size=None, pix_fmt="bgr", threads=0, keyframes_only=False, stride=1):
+        import av
+
+        self.video_path = video_path
+        self.pix_fmt = pix_fmt
+        self.stride = stride
+        self.container = av.open(video_path)
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = "AUTO"
+        self.stream.thread_count = threads
+        if keyframes_only:
+            self.stream.codec_context.skip_frame = "NONKEY"
+
+        self.keyframes_only = keyframes_only
+        self.fps = float(self.stream.average_rate or 0)
+        # mpeg-ts and remuxed streams often start at a non-zero pts, timestamps are made relative to it
+        self.start_time = float(self.stream.start_time * self.stream.time_base) if self.stream.start_time is not None and self.stream.time_base else 0.0
+        # mkv and mpeg-ts headers carry no frame count, estimate it from the duration instead
+        self.frame_count = self.stream.frames
+        if not self.frame_count:
+            if self.stream.duration is not None and self.stream.time_base:
+                duration = float(self.stream.duration * self.stream.time_base)
+            else:
+                duration = (self.container.duration or 0) / av.time_base
+            self.frame_count = int(duration * self.fps)
+        self.source_size = (self.stream.codec_context.width, self.stream.codec_context.height)
+        self.width, self.height = _output_size(*self.source_size, size)
+
+    def __iter__(self):
+        av_format = "gray" if self.pix_fmt == "gray" else "bgr24"
+        try:
+            for position, frame in enumerate(self.container.decode(self.stream)):
+                # frames are skipped and indexed by the same decode counter, so consumers that
+                # pick frames by index % stride see exactly the frames decoded here, even with
+                # variable frame rate or a non-zero first pts
+                if position % self.stride:
+                    continue
+                if frame.time is not None:
+                    timestamp = max(0.0, frame.time - self.start_time)
+                else:
+                    timestamp = position / (self.fps or 1)
+                # with keyframe skipping the counter only sees keyframes, so their index comes from the time
+                index = round(timestamp * self.fps) if self.keyframes_only and self.fps else position
+                array = frame.to_ndarray(width=self.width, height=self.height, format=av_format)
+                if self.pix_fmt == "hsv":
+                    array = cv2.cvtColor(array, cv2.COLOR_BGR2HSV)
+                metrics.count("frames_decoded")
+                yield index, timestamp, array
+        finally:
+            self.container.close()
+
+
+BACKENDS = {"opencv": OpenCVDecoder, "ffmpeg": FFmpegDecoder, "pyav": PyAVDecoder}
+
+
+def open_decoder(video_path, backend="opencv", size=None, pix_fmt="bgr", threads=0, keyframes_only=False, stride=1):
+    """
+    open a frame decoder yielding (frame_index, timestamp_seconds, ndarray).
+    size is (width, height) with either side None to keep the aspect ratio,
+    pix_fmt is one of "bgr", "gray" or "hsv", threads=0 lets the backend choose
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown decoder backend: {backend}")
+    if pix_fmt not in PIX_FMTS:
+        raise ValueError(f"unknown pixel format: {pix_fmt}")
+    return BACKENDS[backend](video_path, size, pix_fmt, threads, keyframes_only, stride)
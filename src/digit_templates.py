@@ -0,0 +1,95 @@
+import cv2
+import numpy as np
+
+GLYPH_SIZE = (15, 20)
+# both separators parse_counter_text accepts are learned as one glyph class
+SEPARATORS = {"/": "/", "|": "/"}
+
+
+def segment_glyphs(binary, min_width=3):
+    """
+    split a binarized counter crop into glyph masks, left to right, by the empty columns
+    between them. the foreground is whichever value covers less of the crop, so both
+    otsu polarities work
+    """
+    foreground = binary > 127
+    if foreground.mean() > 0.5:
+        foreground = ~foreground
+    columns = np.concatenate([[0], foreground.any(axis=0).astype(np.int8), [0]])
+    edges = np.flatnonzero(np.diff(columns))
+
+    glyphs = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        if end - start < min_width:
+            continue
+        rows = np.flatnonzero(foreground[:, start:end].any(axis=1))
+        glyphs.append(foreground[rows[0]:rows[-1] + 1, start:end])
+    return glyphs
+
+
+def glyph_vector(glyph):
+    """
+    zero-mean unit-norm feature of a glyph mask. narrow glyphs are centered on a canvas
+    of at least 3/4 of their height first, so "1" is not stretched into a block
+    """
+    height, width = glyph.shape
+    canvas = np.zeros((height, max(width, int(height * 0.75))), dtype=np.float32)
+    left = (canvas.shape[1] - width) // 2
+    canvas[:, left:left + width] = glyph
+    vector = cv2.resize(canvas, GLYPH_SIZE, interpolation=cv2.INTER_AREA).ravel()
+    vector -= vector.mean()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class DigitTemplateMatcher(object):
+    """
+    per-glyph templates of a fixed-font "x/y/z" counter, learned from crops whose text
+    is known. matching is one correlation (dot product) per glyph and template
+    """
+
+    def __init__(self, match_threshold=0.85, min_margin=0.05):
+        self.match_threshold = match_threshold
+        self.min_margin = min_margin
+        self.sums = {}
+        self.counts = {}
+        self.labels = []
+        self.templates = None
+        self.learned_reads = 0
+
+    def learn(self, binary, text):
+        """add the glyphs of one crop with known text, False if segmentation disagrees with it"""
+        text = "".join(SEPARATORS.get(c, c) for c in text.replace(" ", ""))
+        glyphs = segment_glyphs(binary)
+        if len(glyphs) != len(text):
+            return False
+
+        for char, glyph in zip(text, glyphs):
+            vector = glyph_vector(glyph)
+            self.sums[char] = self.sums.get(char, 0) + vector
+            self.counts[char] = self.counts.get(char, 0) + 1
+
+        self.labels = sorted(self.sums)
+        templates = np.stack([self.sums[c] / self.counts[c] for c in self.labels])
+        templates -= templates.mean(axis=1, keepdims=True)
+        self.templates = templates / np.maximum(np.linalg.norm(templates, axis=1, keepdims=True), 1e-6)
+        self.learned_reads += 1
+        return True
+
+    def match(self, binary):
+        """return (text, confidence) where confidence is the weakest glyph's correlation, or (None, score)"""
+        if self.templates is None:
+            return None, 0.0
+        glyphs = segment_glyphs(binary)
+        if not glyphs:
+            return None, 0.0
+
+        scores = np.stack([glyph_vector(glyph) for glyph in glyphs]) @ self.templates.T
+        order = np.argsort(scores, axis=1)
+        best = scores[np.arange(len(glyphs)), order[:, -1]]
+        second = scores[np.arange(len(glyphs)), order[:, -2]] if len(self.labels) > 1 else np.zeros(len(glyphs))
+
+        confidence = float(best.min())
+        if confidence < self.match_threshold or float((best - second).min()) < self.min_margin:
+            return None, confidence
+        return "".join(self.labels[i] for i in order[:, -1]), confidence
@@ -0,0 +1,307 @@
+import cv2
+import math
+import numpy as np
+from tqdm import tqdm
+from decoder import open_decoder
+from motion_estimators import FarnebackEstimator, create_estimator
+from functools import reduce, cached_property
+from collections import namedtuple
+
+Scene = namedtuple("Scene", ["start", "end"])
+
+DEFAULT_ESTIMATOR = FarnebackEstimator()
+
+
+class FramePacket(object):
+    """one decoded frame with lazily shared color conversions"""
+
+    def __init__(self, index, timestamp, frame):
+        self.index = index
+        self.timestamp = timestamp
+        self.frame = frame
+
+    @cached_property
+    def gray(self):
+        return cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
+
+    @cached_property
+    def hsv(self):
+        return cv2.cvtColor(self.frame, cv2.COLOR_BGR2HSV)
+
+
+class FrameAnalyzer(object):
+    """
+    base class for per-frame analyzers subscribed to a frame bus.
+    an analyzer receives every `stride`-th frame and builds its own signal
+    as parallel `timestamps` / `values` lists
+    """
+    stride = 1
+
+    def __init__(self):
+        self.timestamps = []
+        self.values = []
+
+    def process(self, packet):
+        raise NotImplementedError
+
+    def finish(self, fps, total_frames):
+        pass
+
+
+class FrameBus(object):
+    """
+    decode a video once and dispatch each frame to all subscribed analyzers.
+    frames come from decoder.open_decoder, so the backend, output size and decode
+    threads are selectable; only frames some analyzer samples are converted
+    """
+
+    def __init__(self, video_path, analyzers=None, desc="Frame Bus", backend="opencv", size=None, threads=0):
+        self.video_path = video_path
+        self.analyzers = list(analyzers or [])
+        self.desc = desc
+        self.backend = backend
+        self.size = size
+        self.threads = threads
+        self.fps = 0.0
+        self.total_frames = 0
+
+    def subscribe(self, analyzer):
+        self.analyzers.append(analyzer)
+        return analyzer
+
+    def run(self):
+        stride = reduce(math.gcd, (a.stride for a in self.analyzers), 0) or 1
+        decoder = open_decoder(self.video_path, self.backend, self.size, "bgr", self.threads, stride=stride)
+
+        self.fps = decoder.fps
+        self.total_frames = decoder.frame_count
+
+        last_index = -1
+        with tqdm(total=self.total_frames, desc=self.desc, unit="frames") as pbar:
+            for index, timestamp, frame in decoder:
+                last_index = index
+                subscribers = [a for a in self.analyzers if index % a.stride == 0]
+                if subscribers:
+                    packet = FramePacket(index, timestamp, frame)
+                    for analyzer in subscribers:
+                        analyzer.process(packet)
+                pbar.update(stride)
+
+        # the container's frame count is an estimate at best, never end before the last decoded frame
+        self.total_frames = max(self.total_frames, last_index + 1)
+        for analyzer in self.analyzers:
+            analyzer.finish(self.fps, self.total_frames)
+        return self.analyzers
+
+
+def compute_histogram(hsv):
+    """normalized hue/saturation histogram used for color change detection"""
+    hist = cv2.calcHist([hsv], [0, 1], None, [50, 50], [0, 180, 0, 256])
+    cv2.normalize(hist, hist, 0, 1, cv2.NORM_MINMAX)
+    return hist
+
+
+def measure_change(prev_gray, gray, prev_hist, hist, estimator=None):
+    """
+    return (combined_change, motion_intensity) between two sampled frames.
+    estimator is a motion_estimators backend, farneback by default
+    """
+    magnitude, _ = (estimator or DEFAULT_ESTIMATOR).estimate(prev_gray, gray)
+    motion_intensity = np.mean(magnitude)
+
+    distance = cv2.compareHist(prev_hist, hist, cv2.HISTCMP_CORREL)
+    color_change_intensity = 1 - distance
+
+    combined_change = (color_change_intensity * 0.7) + (motion_intensity * 0.3)
+    return combined_change, motion_intensity
+
+
+class ChangeClassifier(object):
+    """
+    the significant-change test every scene detection path shares: each sample is
+    compared with the previous one by color histogram and motion. serial, parallel,
+    resumable, coarse-to-fine and live detection all go through this class so their
+    decisions cannot drift apart
+    """
+
+    def __init__(self, diff_threshold=0.5, motion_threshold=0.05, motion_estimator="farneback"):
+        self.diff_threshold = diff_threshold
+        self.motion_threshold = motion_threshold
+        self.estimator = create_estimator(motion_estimator)
+        self.change = None
+        self.reset()
+
+    def reset(self):
+        """forget the previous sample, the next one starts a new comparison"""
+        self.prev_gray = None
+        self.prev_hist = None
+
+    def classify(self, packet):
+        """
+        return (timestamp, significant) for a FramePacket, or None for a sample without a
+        predecessor. the combined change of the last comparison is kept in self.change
+        """
+        gray = packet.gray
+        hist = compute_histogram(packet.hsv)
+
+        result = None
+        if self.prev_gray is not None:
+            self.change, motion_intensity = measure_change(self.prev_gray, gray, self.prev_hist, hist, self.estimator)
+            significant = self.change > self.diff_threshold and motion_intensity > self.motion_threshold
+            result = (packet.timestamp, significant)
+
+        self.prev_gray = gray
+        self.prev_hist = hist
+        return result
+
+
+class SceneSegmenter(object):
+    """debounce per-sample change decisions into scene boundaries"""
+
+    def __init__(self, min_scene_duration=5.0, max_insignificant_changes=3, start=0.0):
+        self.min_scene_duration = min_scene_duration
+        self.max_insignificant_changes = max_insignificant_changes
+        self.current_scene_start = start
+        self.significant_changes = 0
+        self.scenes = []
+
+    def update(self, timestamp, significant):
+        """feed one sample, return the closed scene when a boundary is confirmed"""
+        if significant:
+            self.significant_changes += 1
+
+            if self.significant_changes > self.max_insignificant_changes:
+                if (timestamp - self.current_scene_start) >= self.min_scene_duration:
+                    scene = Scene(self.current_scene_start, timestamp)
+                    self.scenes.append(scene)
+                    self.current_scene_start = timestamp
+                    self.significant_changes = 0
+                    return scene
+        else:
+            self.significant_changes = max(0, self.significant_changes - 1)
+        return None
+
+    def skip(self, count):
+        """account for `count` samples known to be insignificant without feeding them one by one"""
+        self.significant_changes = max(0, self.significant_changes - count)
+
+    def finish(self, final_time):
+        """close the trailing scene if it is long enough"""
+        if (final_time - self.current_scene_start) >= self.min_scene_duration:
+            scene = Scene(self.current_scene_start, final_time)
+            self.scenes.append(scene)
+            return scene
+        return None
+
+
+class SceneAnalyzer(FrameAnalyzer):
+    """optical flow + color histogram scene boundary detection"""
+
+    def __init__(self, diff_threshold=0.5, scene_detection_skip=5, min_scene_duration=5.0, motion_threshold=0.05, motion_estimator="farneback"):
+        super().__init__()
+        self.stride = scene_detection_skip + 1
+        self.classifier = ChangeClassifier(diff_threshold, motion_threshold, motion_estimator)
+        self.segmenter = SceneSegmenter(min_scene_duration)
+
+    @property
+    def scenes(self):
+        return self.segmenter.scenes
+
+    def process(self, packet):
+        result = self.classifier.classify(packet)
+        if result is not None:
+            self.timestamps.append(packet.timestamp)
+            self.values.append(self.classifier.change)
+            self.segmenter.update(*result)
+
+    def finish(self, fps, total_frames):
+        if fps:
+            self.segmenter.finish(total_frames / fps)
+
+
+class MotionAnalyzer(FrameAnalyzer):
+    """count of pixels whose gray level changed by more than `pixel_threshold` since the previous frame"""
+
+    def __init__(self, pixel_threshold=25):
+        super().__init__()
+        self.pixel_threshold = pixel_threshold
+        self.prev_gray = None
+
+    def process(self, packet):
+        gray = packet.gray
+        activity = 0
+        if self.prev_gray is not None:
+            diff = cv2.absdiff(self.prev_gray, gray)
+            activity = int(np.count_nonzero(diff > self.pixel_threshold))
+        self.timestamps.append(packet.timestamp)
+        self.values.append(activity)
+        self.prev_gray = gray
+
+    def timeline(self, fps):
+        return MotionTimeline(self.timestamps, self.values, fps)
+
+    def scene_activity(self, scenes, fps):
+        """sum the motion signal inside each scene"""
+        return self.timeline(fps).scene_activity(scenes)
+
+
+class MotionTimeline(object):
+    """
+    per-frame motion signal with a cumulative-sum index.
+    the activity of any time range is a difference of two prefix sums, and the
+    frame index of a timestamp is computed from the frame rate, so scene queries
+    cost O(1) on constant frame rate video
+    """
+
+    def __init__(self, timestamps, values, fps):
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.values = np.asarray(values, dtype=np.int64)
+        self.fps = fps
+        self.cumulative = np.concatenate(([0], np.cumsum(self.values)))
+
+    def frames_until(self, t):
+        """number of frames with timestamp <= t"""
+        n = len(self.timestamps)
+        if n == 0:
+            return 0
+        i = int((t - self.timestamps[0]) * self.fps) + 1 if self.fps else n
+        i = min(max(i, 0), n)
+        # correct the constant frame rate guess for rounding and variable frame rate
+        while i > 0 and self.timestamps[i - 1] > t:
+            i -= 1
+        while i < n and self.timestamps[i] <= t:
+            i += 1
+        return i
+
+    def activity(self, start, end):
+        """total motion of frames with start < t <= end"""
+        return int(self.cumulative[self.frames_until(end)] - self.cumulative[self.frames_until(start)])
+
+    def scene_activity(self, scenes):
+        return [(scene, self.activity(scene.start, scene.end)) for scene in scenes]
+
+    def save(self, path):
+        np.savez(path, timestamps=self.timestamps, values=self.values, fps=self.fps)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["timestamps"], data["values"], float(data["fps"]))
+
+
+class HistogramAnalyzer(FrameAnalyzer):
+    """color histogram change (1 - correlation) against the previous sampled frame"""
+
+    def __init__(self, stride=1):
+        super().__init__()
+        self.stride = stride
+        self.prev_hist = None
+
+    def process(self, packet):
+        hist = compute_histogram(packet.hsv)
+        change = 0.0
+        if self.prev_hist is not None:
+            change = 1 - cv2.compareHist(self.prev_hist, hist, cv2.HISTCMP_CORREL)
+        self.timestamps.append(packet.timestamp)
+        self.values.append(change)
+        self.prev_hist = hist
@@ -0,0 +1,115 @@
+import sys
+import json
+import argparse
+import subprocess
+import numpy as np
+from fractions import Fraction
+from render import probe_media
+from frame_bus import FramePacket, SceneSegmenter, ChangeClassifier
+from motion_estimators import ESTIMATORS
+
+
+def read_exactly(stream, size):
+    """read `size` bytes from a pipe, returning fewer only at end of stream"""
+    chunks = []
+    while size:
+        data = stream.read(size)
+        if not data:
+            break
+        chunks.append(data)
+        size -= len(data)
+    return b"".join(chunks)
+
+
+def stream_scenes(
+    source,
+    fps=None,
+    width=None,
+    height=None,
+    follow=False,
+    diff_threshold=0.5,
+    scene_detection_skip=5,
+    min_scene_duration=5.0,
+    motion_threshold=0.05,
+    motion_estimator="farneback"
+):
+    """
+    detect scenes on a live source and yield each Scene as soon as its boundary is confirmed.
+    source may be a file, a url ffmpeg can open or "-" for raw stdin; with follow=True a
+    recording that is still being written is tailed instead of ending at its current size.
+    frames are decoded by an ffmpeg pipe that already drops the skipped frames, and only
+    the previous sample is kept, so memory does not grow with stream length
+    """
+    if fps is None or width is None or height is None:
+        if source == "-":
+            raise ValueError("fps, width and height are required when reading from stdin")
+        _, video_stream, _ = probe_media(source)
+        fps = fps or float(Fraction(video_stream["r_frame_rate"]))
+        width = width or int(video_stream["width"])
+        height = height or int(video_stream["height"])
+
+    stride = scene_detection_skip + 1
+    command = ["ffmpeg", "-v", "error"]
+    if source != "-":
+        command.append("-nostdin")
+    if follow:
+        command += ["-follow", "1", "-i", f"file:{source}"]
+    else:
+        command += ["-i", "pipe:0" if source == "-" else source]
+    # frames are scaled to the declared size, so a wrong --width/--height never misaligns the pipe
+    command += [
+        "-an", "-vf", f"select=not(mod(n\\,{stride})),scale={width}:{height}",
+        "-fps_mode", "passthrough",
+        "-f", "rawvideo", "-pix_fmt", "bgr24", "-"
+    ]
+
+    frame_bytes = width * height * 3
+    segmenter = SceneSegmenter(min_scene_duration)
+    classifier = ChangeClassifier(diff_threshold, motion_threshold, motion_estimator)
+    index = 0
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=frame_bytes)
+    try:
+        while True:
+            data = read_exactly(process.stdout, frame_bytes)
+            if len(data) < frame_bytes:
+                break
+
+            frame = np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+            result = classifier.classify(FramePacket(index, index / fps, frame))
+            if result is not None:
+                scene = segmenter.update(*result)
+                if scene is not None:
+                    segmenter.scenes.clear()
+                    yield scene
+
+            index += stride
+
+        scene = segmenter.finish(index / fps)
+        if scene is not None:
+            yield scene
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print scenes of a live stream or growing recording as json lines")
+    parser.add_argument("--input", required=True, help="Video file, stream url or - for stdin")
+    parser.add_argument("--follow", action="store_true", help="Tail a recording that is still being written")
+    parser.add_argument("--fps", type=float, help="Frame rate (required for stdin)")
+    parser.add_argument("--width", type=int, help="Frame width (required for stdin)")
+    parser.add_argument("--height", type=int, help="Frame height (required for stdin)")
+    parser.add_argument("--motion-estimator", choices=sorted(ESTIMATORS), default="farneback", help="Motion estimator backend (default: farneback)")
+    parser.add_argument("--min-scene-duration", type=float, default=5.0, help="Minimum scene length in seconds (default: 5.0)")
+
+    args = parser.parse_args()
+
+    try:
+        for scene in stream_scenes(args.input, args.fps, args.width, args.height, args.follow, min_scene_duration=args.min_scene_duration, motion_estimator=args.motion_estimator):
+            print(json.dumps({"start": scene.start, "end": scene.end}), flush=True)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"error processing stream: {e}", file=sys.stderr)
@@ -0,0 +1,223 @@
+import os
+import time
+import json
+import cProfile
+import resource
+import threading
+from contextlib import contextmanager
+
+PROMETHEUS_PREFIX = "video_distillation"
+
+# recorder the module-level helpers report to, set while a MetricsRecorder is entered
+_active = None
+
+
+def _proc_io():
+    """(bytes read, bytes written) by this process through read/write syscalls, pipes included"""
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["rchar"]), int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_inblock * 512, usage.ru_oublock * 512
+
+
+def _current_rss():
+    """resident set size in bytes, falling back to the lifetime peak where /proc is missing"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class StageMetrics(object):
+    """accumulated measurements of one named stage, summed over every time it was entered"""
+
+    def __init__(self, name):
+        self.name = name
+        self.runs = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.peak_rss_bytes = 0
+        self.counters = {"frames_decoded": 0}
+        self.external_calls = {}
+
+    def to_dict(self):
+        return {
+            "stage": self.name,
+            "runs": self.runs,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "peak_rss_bytes": self.peak_rss_bytes,
+            **self.counters,
+            "external_calls": sum(self.external_calls.values()),
+            "external_calls_by_kind": dict(self.external_calls)
+        }
+
+
+class MetricsRecorder(object):
+    """
+    per-stage wall time, cpu time, bytes read/written, peak rss, frames decoded and external
+    calls. stages nest and are named by their path ("summary/render"); counts reported with
+    count() or external_call() go to every open stage. cpu time and bytes include child
+    processes that finished inside the stage, frames decoded in worker processes are not seen.
+    stages listed in profile_stages ("all" for every stage) are profiled with cProfile and
+    dumped to profile_dir/<stage>.prof
+    """
+
+    def __init__(self, profile_stages=(), profile_dir=None, sample_interval=0.05):
+        self.profile_stages = set(profile_stages)
+        self.profile_dir = profile_dir
+        self.sample_interval = sample_interval
+        self.stages = {}
+        self._open = []
+        self._lock = threading.Lock()
+        self._profiling = False
+        self._sampler = None
+        self._stop = threading.Event()
+        self._previous = None
+
+    def __enter__(self):
+        global _active
+        self._previous, _active = _active, self
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        _active = self._previous
+        return False
+
+    def _sample_rss(self):
+        # rss is polled while stages are open, so short-lived peaks inside a stage are caught
+        while not self._stop.wait(self.sample_interval):
+            self._record_rss()
+
+    def _record_rss(self):
+        rss = _current_rss()
+        with self._lock:
+            for stage in self._open:
+                stage.peak_rss_bytes = max(stage.peak_rss_bytes, rss)
+
+    @contextmanager
+    def stage(self, name):
+        path = "/".join([stage.name for stage in self._open[-1:]] + [name])
+        with self._lock:
+            stage = self.stages.setdefault(path, StageMetrics(path))
+            stage.runs += 1
+            self._open.append(stage)
+            if self._sampler is None:
+                self._stop.clear()
+                self._sampler = threading.Thread(target=self._sample_rss, daemon=True)
+                self._sampler.start()
+        self._record_rss()
+
+        profiler = None
+        if not self._profiling and ("all" in self.profile_stages or name in self.profile_stages):
+            profiler = cProfile.Profile()
+            self._profiling = True
+
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        read_start, written_start = _proc_io()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield stage
+        finally:
+            if profiler:
+                profiler.disable()
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            read, written = _proc_io()
+            children_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+            self._record_rss()
+
+            with self._lock:
+                stage.wall_seconds += wall
+                stage.cpu_seconds += cpu + (children_end.ru_utime - children.ru_utime) + (children_end.ru_stime - children.ru_stime)
+                stage.bytes_read += read - read_start + (children_end.ru_inblock - children.ru_inblock) * 512
+                stage.bytes_written += written - written_start + (children_end.ru_oublock - children.ru_oublock) * 512
+                self._open.remove(stage)
+                if not self._open and self._sampler is not None:
+                    self._stop.set()
+                    self._sampler = None
+
+            if profiler:
+                self._profiling = False
+                os.makedirs(self.profile_dir or ".", exist_ok=True)
+                profiler.dump_stats(os.path.join(self.profile_dir or ".", f"{path.replace('/', '.')}.prof"))
+
+    def count(self, name, value=1):
+        with self._lock:
+            for stage in self._open:
+                stage.counters[name] = stage.counters.get(name, 0) + value
+
+    def external_call(self, kind):
+        with self._lock:
+            for stage in self._open:
+                stage.external_calls[kind] = stage.external_calls.get(kind, 0) + 1
+
+    def report(self):
+        return {
+            "created": time.time(),
+            "pid": os.getpid(),
+            "stages": [stage.to_dict() for stage in self.stages.values()]
+        }
+
+    def prometheus(self):
+        """the report in prometheus text exposition format"""
+        gauges = [
+            ("stage_runs", "Times the stage was entered", lambda s: [({}, s.runs)]),
+            ("stage_wall_seconds", "Wall clock time spent in the stage", lambda s: [({}, s.wall_seconds)]),
+            ("stage_cpu_seconds", "CPU time of the process and finished children in the stage", lambda s: [({}, s.cpu_seconds)]),
+            ("stage_read_bytes", "Bytes read during the stage", lambda s: [({}, s.bytes_read)]),
+            ("stage_written_bytes", "Bytes written during the stage", lambda s: [({}, s.bytes_written)]),
+            ("stage_peak_rss_bytes", "Peak resident set size observed during the stage", lambda s: [({}, s.peak_rss_bytes)]),
+            ("stage_events", "Counted events such as decoded frames", lambda s: [({"event": k}, v) for k, v in s.counters.items()]),
+            ("stage_external_calls", "Subprocesses and remote api requests", lambda s: [({"kind": k}, v) for k, v in s.external_calls.items()])
+        ]
+        lines = []
+        for metric, help_text, samples in gauges:
+            name = f"{PROMETHEUS_PREFIX}_{metric}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for stage in self.stages.values():
+                for labels, value in samples(stage):
+                    label_text = ",".join(f'{k}="{v}"' for k, v in {"stage": stage.name, **labels}.items())
+                    lines.append(f"{name}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_path=None, prometheus_path=None):
+        if json_path:
+            with open(json_path, "w") as f:
+                json.dump(self.report(), f, indent=2)
+        if prometheus_path:
+            with open(prometheus_path, "w") as f:
+                f.write(self.prometheus())
+
+
+@contextmanager
+def stage(name):
+    """time a stage on the active recorder, a no-op when nothing is recording"""
+    if _active is None:
+        yield None
+    else:
+        with _active.stage(name) as metrics:
+            yield metrics
+
+
+def count(name, value=1):
+    if _active is not None:
+        _active.count(name, value)
+
+
+def external_call(kind):
+    if _active is not None:
+        _active.external_call(kind)
@@ -0,0 +1,96 @@
+import cv2
+import numpy as np
+
+
+def intensity_stats(magnitude):
+    """(mean, median, std) of a motion magnitude field, the signal every estimator reports"""
+    if magnitude.size == 0:
+        return 0.0, 0.0, 0.0
+    return float(np.mean(magnitude)), float(np.median(magnitude)), float(np.std(magnitude))
+
+
+class FarnebackEstimator(object):
+    """dense farneback optical flow, magnitudes in pixels"""
+    name = "farneback"
+
+    def __init__(self, pyr_scale=0.5, levels=3, winsize=15, iterations=3, poly_n=5, poly_sigma=1.2, flags=0):
+        self.params = (pyr_scale, levels, winsize, iterations, poly_n, poly_sigma, flags)
+
+    def estimate(self, prev_gray, gray):
+        """return (magnitude, angle) fields between two gray frames"""
+        flow = cv2.calcOpticalFlowFarneback(prev_gray, gray, None, *self.params)
+        return cv2.cartToPolar(flow[..., 0], flow[..., 1])
+
+
+class DISEstimator(object):
+    """dense inverse search optical flow, several times faster than farneback at similar accuracy"""
+    name = "dis"
+
+    def __init__(self, preset=cv2.DISOPTICAL_FLOW_PRESET_FAST):
+        self.dis = cv2.DISOpticalFlow_create(preset)
+
+    def estimate(self, prev_gray, gray):
+        flow = self.dis.calc(prev_gray, gray, None)
+        return cv2.cartToPolar(flow[..., 0], flow[..., 1])
+
+
+class FrameDiffEstimator(object):
+    """
+    absolute gray difference on downsampled frames. magnitudes are gray levels rather
+    than pixels of displacement and there is no direction, so angle is None
+    """
+    name = "framediff"
+
+    def __init__(self, scale=0.25):
+        self.scale = scale
+
+    def estimate(self, prev_gray, gray):
+        if self.scale != 1:
+            prev_gray = cv2.resize(prev_gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+            gray = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return cv2.absdiff(prev_gray, gray).astype(np.float32), None
+
+
+ESTIMATORS = {cls.name: cls for cls in (FarnebackEstimator, DISEstimator, FrameDiffEstimator)}
+CODEC_ESTIMATOR = "codec"
+ESTIMATOR_CHOICES = tuple(ESTIMATORS) + (CODEC_ESTIMATOR,)
+
+
+def create_estimator(name, **params):
+    """pairwise estimator by name; codec motion vectors are per decoded frame, see iter_codec_motion"""
+    if name == CODEC_ESTIMATOR:
+        raise ValueError("codec motion vectors describe consecutive decoded frames, use iter_codec_motion")
+    if name not in ESTIMATORS:
+        raise ValueError(f"unknown motion estimator: {name}")
+    return ESTIMATORS[name](**params)
+
+
+def iter_codec_motion(video_path, threads=0):
+    """
+    yield (frame_index, timestamp, magnitude) from the motion vectors the h.264/hevc
+    decoder already computed, so no flow is estimated at all. every vector is repeated
+    once per 4x4 block it covers so that large blocks weigh like the pixels they move.
+    intra frames carry no vectors and report an empty field
+    """
+    import av
+
+    container = av.open(video_path)
+    try:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        stream.thread_count = threads
+        stream.codec_context.options = {"flags2": "+export_mvs"}
+
+        for index, frame in enumerate(container.decode(stream)):
+            vectors = frame.side_data.get("MOTION_VECTORS")
+            if vectors is None:
+                magnitude = np.zeros(0, dtype=np.float32)
+            else:
+                mvs = vectors.to_ndarray()
+                scale = np.maximum(mvs["motion_scale"], 1).astype(np.float32)
+                magnitude = np.hypot(mvs["motion_x"] / scale, mvs["motion_y"] / scale)
+                blocks = np.maximum(mvs["w"].astype(np.int64) * mvs["h"] // 16, 1)
+                magnitude = np.repeat(magnitude, blocks)
+            yield index, frame.time, magnitude
+    finally:
+        container.close()
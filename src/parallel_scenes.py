@@ -0,0 +1,103 @@
+import os
+import cv2
+import math
+from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor
+from frame_bus import FramePacket, SceneSegmenter, ChangeClassifier
+
+
+def _init_worker():
+    # one decoder per process already saturates a core, avoid opencv oversubscription
+    cv2.setNumThreads(1)
+
+
+def classify_chunk(video_path, start_frame, end_frame, stride, diff_threshold, motion_threshold, motion_estimator="farneback"):
+    """
+    classify sampled frames in [start_frame, end_frame) as significant changes or not.
+    decoding starts one sample early so the first sample of the chunk has a predecessor,
+    which makes the per-sample decisions identical to a serial scan.
+    returns (samples, frames) where frames is one past the last sampled frame index
+    """
+    samples = []
+    classifier = ChangeClassifier(diff_threshold, motion_threshold, motion_estimator)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"could not open video: {video_path}")
+
+    index = max(0, start_frame - stride)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+
+    frames = 0
+    try:
+        while (end_frame is None or index < end_frame) and cap.grab():
+            if index % stride == 0:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                packet = FramePacket(index, cap.get(cv2.CAP_PROP_POS_MSEC) / 1000, frame)
+                frames = index + 1
+                result = classifier.classify(packet)
+                if result is not None and index >= start_frame:
+                    samples.append(result)
+            index += 1
+    finally:
+        cap.release()
+    return samples, frames
+
+
+def plan_chunks(total_frames, stride, workers, chunks_per_worker=4):
+    """split [0, total_frames) into stride-aligned ranges, the last one left open-ended"""
+    chunk_count = max(1, workers * chunks_per_worker)
+    chunk_frames = math.ceil(total_frames / chunk_count / stride) * stride
+    chunk_frames = max(chunk_frames, stride)
+
+    chunks = []
+    start = 0
+    while start < total_frames:
+        end = start + chunk_frames
+        chunks.append((start, end if end < total_frames else None))
+        start = end
+    return chunks or [(0, None)]
+
+
+def find_scenes_parallel(video_path, diff_threshold=0.5, scene_detection_skip=5, min_scene_duration=5.0, motion_threshold=0.05, workers=None, motion_estimator="farneback"):
+    """
+    parallel scene detection over overlapping chunks of the video.
+    chunks are classified in worker processes and the min_scene_duration /
+    significant_changes debounce is replayed over the merged samples in order,
+    so the result matches find_scenes_opencv
+    """
+    workers = workers or os.cpu_count() or 1
+    stride = scene_detection_skip + 1
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"could not open video: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    chunks = plan_chunks(total_frames, stride, workers)
+    segmenter = SceneSegmenter(min_scene_duration)
+    frames_seen = 0
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        results = executor.map(
+            classify_chunk,
+            [video_path] * len(chunks),
+            [start for start, _ in chunks],
+            [end for _, end in chunks],
+            [stride] * len(chunks),
+            [diff_threshold] * len(chunks),
+            [motion_threshold] * len(chunks),
+            [motion_estimator] * len(chunks),
+        )
+        for samples, frames in tqdm(results, total=len(chunks), desc="Scene Detection", unit="chunks"):
+            frames_seen = max(frames_seen, frames)
+            for timestamp, significant in samples:
+                segmenter.update(timestamp, significant)
+
+    # the container's frame count can be short, never end before the last decoded frame, as FrameBus does
+    if fps:
+        segmenter.finish(max(total_frames, frames_seen) / fps)
+    return segmenter.scenes
@@ -139,8 +139,8 @@ def replace_audio_in_video(video_path, audio_path, output_video_path):
     subprocess.call(command, shell=True)
     return output_video_path
 
-def censor_video(video_path, mask_audio_path="peekaboo.mp3", output_path=None):
-    """censor curse words in video"""
+def censor_video(video_path, mask_audio_path="peekaboo.mp3", output_path=None, model=None):
+    """censor curse words in video, pass a loaded whisper model to reuse it across videos"""
     if output_path is None:
         base, ext = os.path.splitext(video_path)
         
@@ -153,7 +153,8 @@ def censor_video(video_path, mask_audio_path="peekaboo.mp3", output_path=None):
         extract_audio_from_video(video_path, temp_audio)
         
         if not os.path.exists("current_transcript.json"):
-            model = whisper.load_model("medium")
+            if model is None:
+                model = whisper.load_model("medium")
             transcript = model.transcribe(
                 video_path, 
                 language="russian",
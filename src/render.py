@@ -0,0 +1,219 @@
+import os
+import json
+import bisect
+import logging
+import metrics
+import tempfile
+import subprocess
+from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor
+
+# encoders able to produce fragments that concatenate with stream-copied source packets
+MATCHING_ENCODERS = {"h264": "libx264", "hevc": "libx265"}
+
+
+def probe_media(video_path):
+    """return (format, first video stream, first audio stream or None) as reported by ffprobe"""
+    command = [
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=duration:stream=codec_type,codec_name,profile,width,height,pix_fmt,r_frame_rate,sample_rate,channels",
+        "-of", "json", video_path
+    ]
+    metrics.external_call("ffprobe")
+    info = json.loads(subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout)
+    video = next((s for s in info.get("streams", []) if s.get("codec_type") == "video"), None)
+    audio = next((s for s in info.get("streams", []) if s.get("codec_type") == "audio"), None)
+    if video is None:
+        raise ValueError(f"no video stream in {video_path}")
+    return info.get("format", {}), video, audio
+
+
+def probe_keyframes(video_path):
+    """sorted keyframe timestamps of the first video stream, read from packet flags without decoding"""
+    command = [
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", video_path
+    ]
+    metrics.external_call("ffprobe")
+    output = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout.decode()
+    keyframes = []
+    for line in output.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            keyframes.append(float(pts_time))
+    return sorted(keyframes)
+
+
+def plan_pieces(scenes, keyframes, min_copy_duration=1.0, tolerance=1e-3):
+    """
+    split scenes into ("copy", start, end) runs between keyframes and short
+    ("encode", start, end) fragments around cut points that are not keyframes
+    """
+    pieces = []
+    for scene in scenes:
+        first = bisect.bisect_left(keyframes, scene.start - tolerance)
+        last = bisect.bisect_right(keyframes, scene.end + tolerance) - 1
+        if first <= last and keyframes[last] - keyframes[first] >= min_copy_duration:
+            copy_start = keyframes[first]
+            copy_end = min(keyframes[last], scene.end)
+            if copy_start - scene.start > tolerance:
+                pieces.append(("encode", scene.start, copy_start))
+            pieces.append(("copy", max(copy_start, scene.start), copy_end))
+            if scene.end - copy_end > tolerance:
+                pieces.append(("encode", copy_end, scene.end))
+        else:
+            pieces.append(("encode", scene.start, scene.end))
+    return pieces
+
+
+def _run_ffmpeg(command):
+    metrics.external_call("ffmpeg")
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()[-2000:]}")
+
+
+def _copy_piece(video_path, start, end, output_path):
+    _run_ffmpeg([
+        "ffmpeg", "-y", "-v", "error", "-nostdin",
+        "-ss", str(start), "-i", video_path, "-t", str(end - start),
+        "-map", "0:v:0", "-an", "-c:v", "copy",
+        "-f", "mpegts", output_path
+    ])
+
+
+def _encode_piece(video_path, start, end, output_path, video_stream, encoder, crf, preset):
+    command = [
+        "ffmpeg", "-y", "-v", "error", "-nostdin",
+        "-ss", str(start), "-i", video_path, "-t", str(end - start),
+        "-map", "0:v:0", "-an",
+        "-c:v", encoder, "-crf", str(crf), "-preset", preset,
+        "-fps_mode", "passthrough"
+    ]
+    if video_stream.get("pix_fmt"):
+        command += ["-pix_fmt", video_stream["pix_fmt"]]
+    profile = (video_stream.get("profile") or "").lower()
+    if encoder == "libx264" and profile in ("baseline", "main", "high"):
+        command += ["-profile:v", profile]
+    _run_ffmpeg(command + ["-f", "mpegts", output_path])
+
+
+def render_scenes(video_path, scenes, output_path, min_copy_duration=1.0, crf=18, preset="veryfast"):
+    """
+    render scenes into one video, stream-copying every keyframe-aligned run and
+    re-encoding only the gop fragments around non-keyframe cut points.
+    fragments are joined with the concat demuxer at the source frame rate and
+    audio is cut from the source in a single filter pass
+    """
+    _, video_stream, audio_stream = probe_media(video_path)
+    encoder = MATCHING_ENCODERS.get(video_stream.get("codec_name"))
+    if encoder is None:
+        # fragments could not be mixed with copied packets, encode every scene instead
+        logging.info(f"[render] no matching encoder for {video_stream.get('codec_name')}, re-encoding all scenes")
+        encoder = "libx264"
+        keyframes = []
+    else:
+        keyframes = probe_keyframes(video_path)
+
+    pieces = plan_pieces(scenes, keyframes, min_copy_duration)
+    copied = sum(end - start for mode, start, end in pieces if mode == "copy")
+    total = sum(scene.end - scene.start for scene in scenes)
+    logging.info(f"[render] {len(pieces)} pieces, {copied:.1f}s of {total:.1f}s stream-copied")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        list_file = os.path.join(temp_dir, "pieces.txt")
+        with open(list_file, "w") as f:
+            for i, (mode, start, end) in enumerate(pieces):
+                piece_path = os.path.join(temp_dir, f"piece_{i:05d}.ts")
+                if mode == "copy":
+                    _copy_piece(video_path, start, end, piece_path)
+                else:
+                    _encode_piece(video_path, start, end, piece_path, video_stream, encoder, crf, preset)
+                f.write(f"file '{piece_path}'\n")
+
+        command = [
+            "ffmpeg", "-y", "-v", "error", "-nostdin",
+            "-f", "concat", "-safe", "0", "-i", list_file
+        ]
+        if audio_stream is not None:
+            select_filter = "+".join(f"between(t,{scene.start},{scene.end})" for scene in scenes)
+            command += [
+                "-i", video_path,
+                "-filter_complex", f"[1:a:0]aselect='{select_filter}',asetpts=N/SR/TB[a]",
+                "-map", "0:v:0", "-map", "[a]", "-c:a", "aac"
+            ]
+        else:
+            command += ["-map", "0:v:0"]
+        _run_ffmpeg(command + ["-c:v", "copy", output_path])
+
+    return output_path
+
+
+def segment_scenes(video_path, scenes, output_directory, prefix="scene_"):
+    """
+    write every non-overlapping scene to `<prefix><n>.mp4` in one ffmpeg pass with the
+    segment muxer. streams are copied, so each file starts at the first keyframe at or
+    after its scene start. raises ValueError when two boundaries fall before the same
+    keyframe, since the muxer would then shift every following segment
+    """
+    boundaries = sorted({t for scene in scenes for t in (scene.start, scene.end)} - {0.0})
+    if not boundaries:
+        return []
+
+    keyframes = probe_keyframes(video_path)
+    snapped = [bisect.bisect_left(keyframes, t) for t in boundaries[:-1]]
+    if len(set(snapped)) < len(snapped):
+        raise ValueError("scenes are shorter than the keyframe interval, stream copy cannot split them")
+
+    segment_starts = [0.0] + boundaries[:-1]
+    pattern = os.path.join(output_directory, f"{prefix}segment_%05d.mp4")
+
+    _run_ffmpeg([
+        "ffmpeg", "-y", "-v", "error", "-nostdin",
+        "-i", video_path, "-t", str(boundaries[-1]),
+        "-map", "0:v:0", "-map", "0:a:0?", "-c", "copy",
+        "-f", "segment", "-segment_times", ",".join(str(t) for t in boundaries[:-1]),
+        "-reset_timestamps", "1",
+        pattern
+    ])
+
+    outputs = []
+    keep = {}
+    for i, scene in enumerate(scenes):
+        segment_index = bisect.bisect_left(segment_starts, scene.start)
+        keep[segment_index] = os.path.join(output_directory, f"{prefix}{i+1}.mp4")
+    for segment_index in range(len(segment_starts)):
+        segment_path = pattern % segment_index
+        if not os.path.exists(segment_path):
+            continue
+        if segment_index in keep:
+            os.replace(segment_path, keep[segment_index])
+            outputs.append(keep[segment_index])
+        else:
+            # gap between scenes that the detector dropped
+            os.remove(segment_path)
+    return outputs
+
+
+def _encode_scene(job):
+    video_path, start, end, output_path, threads = job
+    _run_ffmpeg([
+        "ffmpeg", "-y", "-v", "error", "-nostdin",
+        "-ss", str(start), "-i", video_path, "-t", str(end - start),
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-c:v", "libx264", "-c:a", "aac", "-threads", str(threads),
+        output_path
+    ])
+    return output_path
+
+
+def encode_scenes_parallel(video_path, scenes, output_directory, workers=None, prefix="scene_"):
+    """frame-accurate export, re-encoding scenes in parallel worker processes"""
+    workers = workers or os.cpu_count() or 1
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    jobs = [
+        (video_path, scene.start, scene.end, os.path.join(output_directory, f"{prefix}{i+1}.mp4"), threads)
+        for i, scene in enumerate(scenes)
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(tqdm(executor.map(_encode_scene, jobs), total=len(jobs), desc="Exporting Scenes", unit="scenes"))
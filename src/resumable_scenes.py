@@ -0,0 +1,135 @@
+import os
+import cv2
+import pickle
+import logging
+import tempfile
+from tqdm import tqdm
+from frame_bus import FramePacket, SceneSegmenter, ChangeClassifier
+
+CHECKPOINT_VERSION = 1
+
+
+def save_checkpoint(path, state):
+    """write the detector state atomically so a crash never leaves a torn checkpoint"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path, video_path, params):
+    """return the saved state if it belongs to this video and these parameters"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        state = pickle.load(f)
+    stat = os.stat(video_path)
+    if (
+        state.get("version") != CHECKPOINT_VERSION
+        or state.get("params") != params
+        or state.get("video") != (os.path.abspath(video_path), stat.st_size)
+    ):
+        logging.warning(f"[scene checkpoint] ignoring {path}, it was written for another video or parameters")
+        return None
+    return state
+
+
+def iter_scenes(
+    video_path,
+    checkpoint_path=None,
+    checkpoint_every=1800,
+    diff_threshold=0.5,
+    scene_detection_skip=5,
+    min_scene_duration=5.0,
+    motion_threshold=0.05,
+    motion_estimator="farneback"
+):
+    """
+    generator version of find_scenes_opencv that yields scenes as they are confirmed.
+    every `checkpoint_every` samples the previous frame, histogram, debounce counter and
+    emitted scenes are saved to checkpoint_path. a later call with the same checkpoint
+    re-yields the saved scenes and seeks to where the last run stopped
+    """
+    params = dict(
+        diff_threshold=diff_threshold,
+        scene_detection_skip=scene_detection_skip,
+        min_scene_duration=min_scene_duration,
+        motion_threshold=motion_threshold,
+        motion_estimator=motion_estimator
+    )
+    classifier = ChangeClassifier(diff_threshold, motion_threshold, motion_estimator)
+    stride = scene_detection_skip + 1
+    stat = os.stat(video_path)
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"could not open video: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    segmenter = SceneSegmenter(min_scene_duration)
+    index = 0
+
+    state = load_checkpoint(checkpoint_path, video_path, params)
+    if state is not None:
+        index = state["index"]
+        classifier.prev_gray = state["prev_gray"]
+        classifier.prev_hist = state["prev_hist"]
+        segmenter.current_scene_start = state["current_scene_start"]
+        segmenter.significant_changes = state["significant_changes"]
+        segmenter.scenes = list(state["scenes"])
+        logging.info(f"[scene checkpoint] resuming at frame {index} with {len(segmenter.scenes)} scenes")
+        yield from segmenter.scenes
+        if state.get("finished"):
+            cap.release()
+            return
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+
+    def checkpoint(finished=False):
+        if checkpoint_path:
+            save_checkpoint(checkpoint_path, {
+                "version": CHECKPOINT_VERSION,
+                "video": (os.path.abspath(video_path), stat.st_size),
+                "params": params,
+                "index": index,
+                "prev_gray": classifier.prev_gray,
+                "prev_hist": classifier.prev_hist,
+                "current_scene_start": segmenter.current_scene_start,
+                "significant_changes": segmenter.significant_changes,
+                "scenes": segmenter.scenes,
+                "finished": finished
+            })
+
+    samples_since_checkpoint = 0
+    frames_seen = 0
+    try:
+        with tqdm(total=total_frames, initial=index, desc="Scene Detection", unit="frames") as pbar:
+            while cap.grab():
+                if index % stride == 0:
+                    ret, frame = cap.retrieve()
+                    if not ret:
+                        break
+                    packet = FramePacket(index, cap.get(cv2.CAP_PROP_POS_MSEC) / 1000, frame)
+                    frames_seen = index + 1
+                    result = classifier.classify(packet)
+                    scene = segmenter.update(*result) if result is not None else None
+                    samples_since_checkpoint += 1
+                    if scene is not None:
+                        yield scene
+
+                index += 1
+                pbar.update(1)
+
+                if samples_since_checkpoint >= checkpoint_every and index % stride == 0:
+                    checkpoint()
+                    samples_since_checkpoint = 0
+    finally:
+        cap.release()
+
+    # the container's frame count can be short, never end before the last decoded frame, as FrameBus does
+    if fps:
+        scene = segmenter.finish(max(total_frames, frames_seen) / fps)
+        if scene is not None:
+            yield scene
+    checkpoint(finished=True)
@@ -0,0 +1,136 @@
+import os
+import time
+import json
+import pickle
+import hashlib
+import logging
+import tempfile
+
+SAMPLE_BYTES = 1024 * 1024
+# temp files older than this are left over from a put that crashed, not one still writing
+STALE_TEMP_SECONDS = 3600
+
+
+def fingerprint_file(path, sample_bytes=SAMPLE_BYTES):
+    """
+    content fingerprint of a media file from its size and sampled head/middle/tail bytes.
+    renamed or copied inputs keep their fingerprint, edited ones do not
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, "rb") as f:
+        for offset in (0, max(0, size // 2 - sample_bytes // 2), max(0, size - sample_bytes)):
+            f.seek(offset)
+            digest.update(f.read(sample_bytes))
+    return digest.hexdigest()
+
+
+class StageCache(object):
+    """
+    content-addressed on-disk cache of pipeline stage outputs.
+    entries are keyed by input fingerprint, stage name and stage parameters and
+    evicted least-recently-used first once the directory exceeds max_bytes.
+    several processes may share one directory: an entry another process evicts
+    in the meantime is treated as a miss, never as an error
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._fingerprints = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def fingerprint(self, path):
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self._fingerprints:
+            self._fingerprints[memo_key] = fingerprint_file(path)
+        return self._fingerprints[memo_key]
+
+    def key(self, input_path, stage, params):
+        payload = json.dumps(
+            {"input": self.fingerprint(input_path), "stage": stage, "params": params},
+            sort_keys=True,
+            default=str,
+        )
+        return f"{stage}-{hashlib.sha256(payload.encode()).hexdigest()}"
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, input_path, stage, params):
+        """return (hit, value) for a stage result"""
+        path = self._entry_path(self.key(input_path, stage, params))
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return False, None
+        except Exception as e:
+            logging.warning(f"[stage cache] dropping unreadable entry {path}: {e}")
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return False, None
+
+        # mtime doubles as the last access time for lru eviction
+        try:
+            os.utime(path, None)
+        except FileNotFoundError:
+            # evicted by another process after it was loaded
+            return False, None
+        logging.info(f"[stage cache] hit for {stage}")
+        return True, value
+
+    def put(self, input_path, stage, params, value):
+        path = self._entry_path(self.key(input_path, stage, params))
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.evict()
+
+    def memoize(self, input_path, stage, params, compute, should_store=lambda value: value is not None):
+        hit, value = self.get(input_path, stage, params)
+        if hit:
+            return value
+        value = compute()
+        if should_store(value):
+            self.put(input_path, stage, params, value)
+        return value
+
+    def evict(self):
+        """
+        drop least recently used entries until the cache fits in max_bytes, and temp
+        files orphaned by a put that crashed
+        """
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+                if name.endswith(".tmp") and now - stat.st_mtime > STALE_TEMP_SECONDS:
+                    os.remove(path)
+                    logging.info(f"[stage cache] removed orphaned {name}")
+            except FileNotFoundError:
+                continue
+            if name.endswith(".pkl"):
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+                logging.info(f"[stage cache] evicted {name}")
+            except FileNotFoundError:
+                # another process evicted it first
+                pass
+            total -= size
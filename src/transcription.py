@@ -0,0 +1,106 @@
+import time
+import random
+import asyncio
+import logging
+import openai
+import metrics
+
+RETRYABLE_ERRORS = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+
+class TokenBucket(object):
+    """asyncio token bucket allowing `rate` requests per second with bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+async def _transcribe_one(client, bucket, semaphore, scene, load_audio, retries, backoff, model, language):
+    for attempt in range(retries + 1):
+        async with semaphore:
+            # audio is loaded inside the semaphore so at most `concurrency` clips sit in memory
+            audio_bytes = await asyncio.to_thread(load_audio, scene)
+            await bucket.acquire()
+            metrics.external_call("whisper_api")
+            try:
+                response = await client.audio.transcriptions.create(
+                    model=model,
+                    file=("scene.wav", audio_bytes),
+                    response_format="text",
+                    language=language
+                )
+                return response.strip()
+            except RETRYABLE_ERRORS as e:
+                if attempt == retries:
+                    raise
+                delay = backoff * (2 ** attempt) * (1 + random.random())
+                logging.warning(f"[transcription retry {attempt + 1}/{retries} for scene {scene.start:.1f}-{scene.end:.1f} in {delay:.1f}s]: {e}")
+        await asyncio.sleep(delay)
+
+
+async def transcribe_scenes_async(
+    scenes,
+    load_audio,
+    concurrency=4,
+    rate=2.0,
+    retries=3,
+    backoff=1.0,
+    api_key=None,
+    base_url=None,
+    model="whisper-1",
+    language="ru"
+):
+    """
+    transcribe scenes concurrently, returning transcripts in scene order.
+    load_audio(scene) must return the scene audio as wav bytes.
+    requests are bounded by `concurrency`, limited to `rate` per second and retried
+    with exponential backoff on connection, rate limit and server errors.
+    scenes that still fail are logged and returned as None
+    """
+    # local stand-in servers usually do not check the key, but the client requires one
+    if base_url and not api_key:
+        api_key = "local"
+    client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+    bucket = TokenBucket(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    try:
+        results = await asyncio.gather(
+            *[
+                _transcribe_one(client, bucket, semaphore, scene, load_audio, retries, backoff, model, language)
+                for scene in scenes
+            ],
+            return_exceptions=True
+        )
+    finally:
+        await client.close()
+
+    transcripts = []
+    for scene, result in zip(scenes, results):
+        if isinstance(result, Exception):
+            logging.error(f"[whisper api error for scene {scene.start}-{scene.end}]: {result}")
+            result = None
+        transcripts.append(result)
+    return transcripts
+
+
+def transcribe_scenes(scenes, load_audio, **options):
+    """blocking wrapper around transcribe_scenes_async"""
+    return asyncio.run(transcribe_scenes_async(scenes, load_audio, **options))
@@ -4,36 +4,124 @@ import os
 from pydub import AudioSegment
 import matplotlib.pyplot as plt
 import numpy as np
-import tempfile
-from silero_vad import load_silero_vad, read_audio, get_speech_timestamps
+import torch
+from audio_stream import EnergyIndex, stream_pcm
+from silero_vad import load_silero_vad, VADIterator
 
 def convert_mp4_to_wav(video_path, output_wav_path=None):
     """convert mp4 video to wav audio"""
-    dir_path = os.path.dirname(video_path)
-    base_name = os.path.splitext(os.path.basename(video_path))[0]
-    output_wav_path = os.path.join(dir_path, f"{base_name}_temp.wav")
+    if output_wav_path is None:
+        dir_path = os.path.dirname(video_path)
+        base_name = os.path.splitext(os.path.basename(video_path))[0]
+        output_wav_path = os.path.join(dir_path, f"{base_name}_temp.wav")
     command = f'ffmpeg -i "{video_path}" -ab 160k -ac 1 -ar 16000 -vn "{output_wav_path}" -y'
     subprocess.run(command, shell=True, check=True)
     
     return output_wav_path
 
-def plot_segment_energy(wav_path, merged_segments):
-    """calculate and plot mean audio energy for each segment"""
-    
-    print("loading audio for energy analysis...")
-    audio = AudioSegment.from_file(wav_path)
+def stream_speech_segments(
+    media_path,
+    model=None,
+    threshold=0.5,
+    min_speech_duration_ms=250,
+    min_silence_duration_ms=100,
+    speech_pad_ms=30,
+    energy_index=None,
+    sample_rate=16000,
+    chunk_seconds=10.0
+):
+    """
+    yield {'start', 'end'} speech segments in seconds as soon as each one closes.
+    16 khz mono pcm is read from an ffmpeg pipe in chunk_seconds blocks and fed to
+    silero's VADIterator in 512-sample windows, so memory stays constant and nothing is
+    written to disk. segments shorter than min_speech_duration_ms are dropped like
+    get_speech_timestamps does. pass an EnergyIndex to fill it from the same pcm
+    """
+    if model is None:
+        model = load_silero_vad()
+    vad_iterator = VADIterator(
+        model,
+        threshold=threshold,
+        sampling_rate=sample_rate,
+        min_silence_duration_ms=min_silence_duration_ms,
+        speech_pad_ms=speech_pad_ms
+    )
+    window = 512 if sample_rate == 16000 else 256
+    min_speech = min_speech_duration_ms / 1000
+
+    start = None
+    position = 0
+    carry = np.zeros(0, dtype=np.int16)
+    for block in stream_pcm(media_path, sample_rate, 1, chunk_seconds):
+        if energy_index is not None:
+            energy_index.update(block)
+        samples = np.concatenate((carry, block[:, 0]))
+        usable = len(samples) - len(samples) % window
+        audio = torch.from_numpy(samples[:usable].astype(np.float32) / 32768.0)
+        carry = samples[usable:]
+
+        for offset in range(0, usable, window):
+            event = vad_iterator(audio[offset:offset + window], return_seconds=True)
+            if not event:
+                continue
+            if "start" in event:
+                start = event["start"]
+            elif "end" in event and start is not None:
+                if event["end"] - start >= min_speech:
+                    yield {"start": start, "end": event["end"]}
+                start = None
+        position += usable
+
+    # speech running into the end of the stream is closed at the last full window
+    end = position / sample_rate
+    if start is not None and end - start >= min_speech:
+        yield {"start": start, "end": end}
+    vad_iterator.reset_states()
+
+def detect_speech_segments(media_path, model=None):
+    """run silero vad once over a media file, return speech segments in seconds"""
+    return list(stream_speech_segments(media_path, model))
+
+def speech_ratio(speech_segments, start, end):
+    """fraction of [start, end] covered by sorted speech segments"""
+    if end <= start:
+        return 0.0
+
+    covered = 0.0
+    for seg in speech_segments:
+        if seg['end'] <= start:
+            continue
+        if seg['start'] >= end:
+            break
+        covered += min(seg['end'], end) - max(seg['start'], start)
+    return covered / (end - start)
+
+def plot_segment_energy(audio_source, merged_segments):
+    """
+    calculate and plot mean audio energy for each segment.
+    audio_source is a wav path or an already filled audio_stream.EnergyIndex
+    """
+    
+    if isinstance(audio_source, EnergyIndex):
+        audio = None
+    else:
+        print("loading audio for energy analysis...")
+        audio = AudioSegment.from_file(audio_source)
     
     segment_energies = []
     segment_times = []
     segments_with_energy = []
     
     for segment in merged_segments:
-        start_ms = segment['start'] * 1000
-        end_ms = segment['end'] * 1000
-        segment_audio = audio[start_ms:end_ms]
-        
-        samples = np.array(segment_audio.get_array_of_samples())
-        rms = np.sqrt(np.mean(np.square(samples.astype(np.float64))))
+        if audio is None:
+            rms = audio_source.rms(segment['start'], segment['end'])
+        else:
+            start_ms = segment['start'] * 1000
+            end_ms = segment['end'] * 1000
+            segment_audio = audio[start_ms:end_ms]
+            
+            samples = np.array(segment_audio.get_array_of_samples())
+            rms = np.sqrt(np.mean(np.square(samples.astype(np.float64))))
         
         segments_with_energy.append({**segment, 'energy': rms})
         segment_energies.append(rms)
@@ -55,18 +143,18 @@ def plot_segment_energy(wav_path, merged_segments):
     
     return clean_segments, plt
 
-def trim_video_by_speech(video_path, output_path, threshold=1.5):
-    """trim video to keep only speech segments"""
-    wav_path = convert_mp4_to_wav(video_path)
-    
-    wav = read_audio(wav_path)
-    model = load_silero_vad()
-    
-    speech_timestamps = get_speech_timestamps(
-        wav,
-        model,
-        return_seconds=True
-    )
+def trim_video_by_speech(video_path, output_path, threshold=1.5, model=None):
+    """
+    trim video to keep only speech segments, pass a loaded silero model to reuse it across videos.
+    speech detection and segment energies come from one streamed pass over the audio,
+    no temporary wav is written
+    """
+    energy_index = EnergyIndex(16000, 1)
+    speech_timestamps = []
+    for seg in stream_speech_segments(video_path, model, energy_index=energy_index):
+        print(f"speech {seg['start']:.1f}s - {seg['end']:.1f}s")
+        speech_timestamps.append(seg)
+    energy_index.finish()
     
     merged_segments = []
     for seg in speech_timestamps:
@@ -75,29 +163,27 @@ def trim_video_by_speech(video_path, output_path, threshold=1.5):
         else:
             merged_segments.append(seg)
     
-    dir_path = os.path.dirname(video_path)
+    # the plot goes next to the output, the source directory may be read-only or shared
+    dir_path = os.path.dirname(os.path.abspath(output_path))
     base_name = os.path.splitext(os.path.basename(video_path))[0]
     output_energy_plot_path = os.path.join(dir_path, f"{base_name}_energy_plot.png")
 
-    clean_segments, plot = plot_segment_energy(wav_path, merged_segments)
+    clean_segments, plot = plot_segment_energy(energy_index, merged_segments)
     print(f"saving energy profile to: {output_energy_plot_path}")
     plot.savefig(output_energy_plot_path)
     plot.close()
 
     select_filter = "+".join([f"between(t,{s['start']},{s['end']})" for s in clean_segments])
+    quoted_filter = f"\\'{select_filter}\\'"
     command = (
         f'ffmpeg -i "{video_path}" '
-        f'-vf "select=\\'{select_filter}\\',setpts=N/FRAME_RATE/TB" '
-        f'-af "aselect=\\'{select_filter}\\',asetpts=N/SR/TB" '
+        f'-vf "select={quoted_filter},setpts=N/FRAME_RATE/TB" '
+        f'-af "aselect={quoted_filter},asetpts=N/SR/TB" '
         f'"{output_path}" -y'
     )
     
     print("running ffmpeg to trim video...")
     subprocess.run(command, shell=True, check=True)
-    
-    if os.path.exists(wav_path):
-        os.remove(wav_path)
-        print(f"removed temporary wav file: {wav_path}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Trim video to keep only speech segments")
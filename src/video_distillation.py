@@ -1,65 +1,87 @@
 import cv2
 import os
+import argparse
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
+from decoder import open_decoder
+from motion_estimators import (
+    CODEC_ESTIMATOR, ESTIMATOR_CHOICES, FarnebackEstimator,
+    create_estimator, intensity_stats, iter_codec_motion
+)
 
 PATH2VID = "/Users/rusiq/Downloads/youtube_dl/katka1.mp4"
 
 
-def process_optical_flow(PATH2VID, output_csv="motion_intensity.csv", output_video="optical_flow_video.mp4"):
-    """process video for optical flow and motion intensity"""
+def process_codec_motion(PATH2VID, output_csv="motion_intensity.csv", threads=0):
+    """motion intensity from decoder-exported motion vectors, no flow and no overlay video"""
+    motion_data = []
+    for frame_index, frame_time, magnitude in tqdm(iter_codec_motion(PATH2VID, threads), desc="Processing"):
+        mean, median, std = intensity_stats(magnitude)
+        motion_data.append({"frame": frame_index,
+                            "time": frame_time,
+                            "mean_motion_intensity": mean,
+                            "median_motion_intensity": median,
+                            "motion_std_dev": std
+                            })
 
-    cap = cv2.VideoCapture(PATH2VID)
-    if not cap.isOpened():
-        raise ValueError(f"could not open video file: {PATH2VID}")
+    motion_df = pd.DataFrame(motion_data)
+    motion_df.to_csv(output_csv, index=False)
+    print(f"motion intensity data saved to {output_csv}")
+
+def process_optical_flow(PATH2VID, output_csv="motion_intensity.csv", output_video="optical_flow_video.mp4", backend="opencv", size=None, threads=0, estimator="farneback"):
+    """
+    process video for optical flow and motion intensity.
+    estimator is one of motion_estimators.ESTIMATOR_CHOICES; "codec" only writes the csv
+    """
+    if estimator == CODEC_ESTIMATOR:
+        return process_codec_motion(PATH2VID, output_csv, threads)
+
+    if estimator == "farneback":
+        motion_estimator = FarnebackEstimator(poly_sigma=1.1, flags=cv2.OPTFLOW_FARNEBACK_GAUSSIAN)
+    else:
+        motion_estimator = create_estimator(estimator)
+
+    decoder = open_decoder(PATH2VID, backend, size, "bgr", threads)
+    frames = iter(decoder)
     
-    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
+    frame_width = decoder.width
+    frame_height = decoder.height
+    fps = int(decoder.fps)
     frame_duration = 1.0 / fps
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    total_frames = decoder.frame_count
 
     fourcc = cv2.VideoWriter_fourcc(*'mp4v')
     out = cv2.VideoWriter(output_video, fourcc, fps, (frame_width, frame_height))
 
-    ret, prev_frame = cap.read()
-    if not ret:
+    first = next(frames, None)
+    if first is None:
         raise ValueError("failed to read the first frame.")
-    prev_gray = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
+    prev_gray = cv2.cvtColor(first[2], cv2.COLOR_BGR2GRAY)
     motion_data = []
 
     frame_index = 0
     with tqdm(total=total_frames/100, desc="Processing") as pbar:
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
+        for _, _, frame in frames:
             curr_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             
-            flow = cv2.calcOpticalFlowFarneback(
-                prev=prev_gray,
-                next=curr_gray,
-                flow=None,
-                pyr_scale=0.5,
-                levels=3,
-                winsize=15,
-                iterations=3,
-                poly_n=5,
-                poly_sigma=1.1,
-                flags=cv2.OPTFLOW_FARNEBACK_GAUSSIAN
-            )
-
-            magnitude, angle = cv2.cartToPolar(flow[..., 0], flow[..., 1])
+            magnitude, angle = motion_estimator.estimate(prev_gray, curr_gray)
+            mean, median, std = intensity_stats(magnitude)
             
             motion_data.append({"frame": frame_index, 
                                 "time": frame_index * frame_duration, 
-                                "mean_motion_intensity": np.mean(magnitude),
-                                "median_motion_intensity": np.median(magnitude),
-                                "motion_std_dev": np.std(magnitude)
+                                "mean_motion_intensity": mean,
+                                "median_motion_intensity": median,
+                                "motion_std_dev": std
                                 })
 
+            if magnitude.shape != curr_gray.shape:
+                magnitude = cv2.resize(magnitude, (frame_width, frame_height), interpolation=cv2.INTER_LINEAR)
+            if angle is None:
+                angle = np.zeros_like(magnitude)
+            elif angle.shape != curr_gray.shape:
+                angle = cv2.resize(angle, (frame_width, frame_height), interpolation=cv2.INTER_NEAREST)
+
             flow_hsv = np.zeros_like(frame)
             flow_hsv[..., 0] = cv2.normalize(angle, None, 0, 179, cv2.NORM_MINMAX)
             flow_hsv[..., 1] = 255
@@ -69,7 +91,7 @@ def process_optical_flow(PATH2VID, output_csv="motion_intensity.csv", output_vid
 
             overlay_frame = cv2.addWeighted(frame, 0.7, flow_bgr, 0.3, 0)
 
-            cv2.putText(overlay_frame, f'avg motion intensity: {round(np.mean(magnitude), 2)}', 
+            cv2.putText(overlay_frame, f'avg motion intensity: {round(mean, 2)}', 
                         (10, frame_height - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
             
             out.write(overlay_frame)
@@ -85,10 +107,17 @@ def process_optical_flow(PATH2VID, output_csv="motion_intensity.csv", output_vid
     motion_df.to_csv(output_csv, index=False)
     print(f"motion intensity data saved to {output_csv}")
 
-    cap.release()
     out.release()
     print(f"optical flow video saved to {output_video}")
 
 if __name__ == '__main__':
-    process_optical_flow(PATH2VID)
-    print("here")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Measure per-frame motion intensity")
+    parser.add_argument("--input", default=PATH2VID, help="Input video file path")
+    parser.add_argument("--output-csv", default="motion_intensity.csv", help="Motion intensity csv path")
+    parser.add_argument("--output-video", default="optical_flow_video.mp4", help="Flow overlay video path")
+    parser.add_argument("--estimator", choices=ESTIMATOR_CHOICES, default="farneback",
+                        help="Motion estimator backend, codec reads decoder motion vectors (default: farneback)")
+    parser.add_argument("--decoder", choices=["opencv", "ffmpeg", "pyav"], default="opencv", help="Frame decoder backend (default: opencv)")
+    args = parser.parse_args()
+
+    process_optical_flow(args.input, args.output_csv, args.output_video, backend=args.decoder, estimator=args.estimator)
\ No newline at end of file
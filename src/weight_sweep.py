@@ -0,0 +1,161 @@
+import os
+import csv
+import json
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from frame_bus import Scene
+from render import probe_media, render_scenes
+
+WEIGHT_KEYS = ("audio", "motion", "speech")
+FEATURE_COLUMNS = ("audio_energy", "motion_activity", "speech_detected")
+
+
+def write_feature_table(path, combined_data, weights):
+    """save (scene, audio_energy, motion_activity, speech_detected) rows in the data/scene_data.csv layout"""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["scene_start", "scene_end", *FEATURE_COLUMNS, "score"])
+        for scene, audio_energy, motion_activity, speech_detected in combined_data:
+            score = sum(w * v for w, v in zip((weights[k] for k in WEIGHT_KEYS), (audio_energy, motion_activity, int(bool(speech_detected)))))
+            writer.writerow([scene.start, scene.end, audio_energy, motion_activity, speech_detected, score])
+
+
+def load_feature_table(path):
+    """return (scenes, features) where features is an (M, 3) matrix in WEIGHT_KEYS order"""
+    table = pd.read_csv(path)
+    scenes = [Scene(start, end) for start, end in zip(table["scene_start"], table["scene_end"])]
+    speech = table["speech_detected"].astype(str).str.lower().isin(["true", "1"])
+    features = np.column_stack([
+        table["audio_energy"].to_numpy(dtype=np.float64),
+        table["motion_activity"].to_numpy(dtype=np.float64),
+        speech.to_numpy(dtype=np.float64),
+    ])
+    return scenes, features
+
+
+def select_scenes_batch(scores, durations, targets, min_scenes=7):
+    """
+    vectorized create_highlight_summary selection for N configurations at once.
+    scores is (N, M), durations (M,), targets (N,); returns an (N, M) boolean mask.
+    the greedy fill walks the M rank positions once with every configuration
+    updated in the same array operation, and the min_scenes back-fill is a
+    cumulative count over the unselected ranks
+    """
+    n_configs, n_scenes = scores.shape
+    # stable descending order, matching list.sort(reverse=True) on ties
+    order = np.argsort(-scores, axis=1, kind="stable")
+    lengths = durations[order]
+
+    picked = np.zeros((n_configs, n_scenes), dtype=bool)
+    accumulated = np.zeros(n_configs)
+    active = np.ones(n_configs, dtype=bool)
+    for rank in range(n_scenes):
+        fits = active & (accumulated + lengths[:, rank] <= targets)
+        picked[:, rank] = fits
+        accumulated = np.where(fits, accumulated + lengths[:, rank], accumulated)
+        active &= accumulated < targets
+        if not active.any():
+            break
+
+    missing = np.maximum(0, min_scenes - picked.sum(axis=1))
+    backfill = ~picked & (np.cumsum(~picked, axis=1) <= missing[:, None])
+    picked |= backfill
+
+    mask = np.zeros_like(picked)
+    np.put_along_axis(mask, order, picked, axis=1)
+    return mask
+
+
+def write_edl(path, scenes):
+    """edit decision list: one source range per line, in playback order"""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["scene_start", "scene_end"])
+        for scene in scenes:
+            writer.writerow([scene.start, scene.end])
+
+
+def sweep(feature_table, configs, output_directory, total_duration=None, min_scenes=7, input_video=None):
+    """
+    evaluate every {"name", "weights", "summary_percent"} config against one feature table
+    and write an edl per config (plus a render when input_video is given).
+    returns a list of per-config result dicts, also saved as sweep.json
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    scenes, features = load_feature_table(feature_table)
+    if total_duration is None:
+        total_duration = max(scene.end for scene in scenes)
+
+    weight_matrix = np.array([[config["weights"][k] for k in WEIGHT_KEYS] for config in configs], dtype=np.float64)
+    targets = np.array([total_duration * config["summary_percent"] for config in configs])
+    durations = np.array([scene.end - scene.start for scene in scenes])
+
+    scores = weight_matrix @ features.T
+    mask = select_scenes_batch(scores, durations, targets, min_scenes)
+
+    results = []
+    for config, selected in zip(configs, mask):
+        chosen = sorted((scenes[i] for i in np.flatnonzero(selected)), key=lambda scene: scene.start)
+        edl_path = os.path.join(output_directory, f"{config['name']}.csv")
+        write_edl(edl_path, chosen)
+
+        result = {**config, "edl": edl_path, "scenes": len(chosen), "duration": sum(s.end - s.start for s in chosen)}
+        if input_video:
+            result["render"] = render_scenes(input_video, chosen, os.path.join(output_directory, f"{config['name']}.mp4"))
+        results.append(result)
+
+    with open(os.path.join(output_directory, "sweep.json"), "w") as f:
+        json.dump(results, f, indent=2)
+    return results
+
+
+def grid_configs(weight_sets, summary_percents):
+    return [
+        {
+            "name": f"w{i}_p{summary_percent:g}",
+            "weights": dict(zip(WEIGHT_KEYS, weights)),
+            "summary_percent": summary_percent
+        }
+        for i, (weights, summary_percent) in enumerate(itertools.product(weight_sets, summary_percents))
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score many highlight summary configurations against one scene feature table")
+    parser.add_argument("--features", required=True, help="Scene feature csv (data/scene_data.csv layout)")
+    parser.add_argument("--output", required=True, help="Output directory for edls and sweep.json")
+    parser.add_argument("--config", help="Json list of {name, weights, summary_percent} configurations")
+    parser.add_argument("--weights", type=float, nargs=3, action="append", metavar=("AUDIO", "MOTION", "SPEECH"),
+                        help="Weight set for a grid sweep, may be repeated")
+    parser.add_argument("--summary-percent", type=float, nargs="+", default=[0.1],
+                        help="Summary fractions for a grid sweep (default: 0.1)")
+    parser.add_argument("--min-scenes", type=int, default=7, help="Minimum scenes per summary (default: 7)")
+    parser.add_argument("--input", help="Source video, used for the total duration and to render each configuration")
+    parser.add_argument("--render", action="store_true", help="Render every configuration from --input")
+
+    args = parser.parse_args()
+
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            configs = json.load(f)
+    elif args.weights:
+        configs = grid_configs(args.weights, args.summary_percent)
+    else:
+        parser.error("either --config or --weights is required")
+
+    if args.render and not args.input:
+        parser.error("--render requires --input")
+
+    total_duration = float(probe_media(args.input)[0]["duration"]) if args.input else None
+    results = sweep(
+        args.features,
+        configs,
+        args.output,
+        total_duration=total_duration,
+        min_scenes=args.min_scenes,
+        input_video=args.input if args.render else None
+    )
+    for result in results:
+        print(f"{result['name']}: {result['scenes']} scenes, {result['duration']:.1f}s -> {result['edl']}")